@@ -0,0 +1,182 @@
+"""
+Measure transition rendering and end-to-end animation speed.
+
+Sources are random frames written to a temporary directory, so the benchmark
+needs no generated images. The legacy transition is one `Image.blend` per fade
+frame followed by the NumPy and BGR conversion the MP4 encoder needs.
+
+Allocations are measured with tracemalloc as the median bytes allocated while
+a fade frame is produced. The float buffers each transition sets up once are
+excluded by the median. One more run of each format is profiled for the
+latency percentiles of its load, fade, encode and write stages.
+
+Usage:
+    python -m benchmarks.animators --width 512 --height 512 --frames 5
+"""
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+from cv2 import COLOR_RGB2BGR, cvtColor
+from PIL import Image
+
+from sda.animators.base_animator import BaseAnimator
+from sda.animators.crossfade import crossfade
+from sda.animators.gif_animator import GIFAnimator
+from sda.animators.mp4_animator import MP4Animator
+from sda.utilities.images import list_dir
+from sda.utilities.profiling import profiling
+
+
+def _time(function, repeat: int) -> list[float]:
+    function()  # warm up
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+
+    return timings
+
+
+def _legacy_fade(src: np.ndarray, dst: np.ndarray, count: int) -> None:
+    src_image, dst_image = Image.fromarray(src), Image.fromarray(dst)
+    for c in range(count):
+        cvtColor(np.array(Image.blend(src_image, dst_image, c / count)), COLOR_RGB2BGR)
+
+
+def _crossfade(src: np.ndarray, dst: np.ndarray, count: int) -> None:
+    src, dst = cvtColor(src, COLOR_RGB2BGR), cvtColor(dst, COLOR_RGB2BGR)
+    for _ in crossfade(src, dst, count):
+        pass
+
+
+def _fade_frame_allocations(animator: BaseAnimator, images: list) -> float:
+    allocated = []
+
+    tracemalloc.start()
+    try:
+        frames = animator._frames(images, 1)
+        while True:
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            frame = next(frames, None)
+            if frame is None:
+                break
+            if not frame[1]:
+                allocated.append(tracemalloc.get_traced_memory()[1] - before)
+            del frame
+    finally:
+        tracemalloc.stop()
+
+    return float(np.median(allocated))
+
+
+def _stages(function, directory: str) -> dict:
+    with profiling(os.path.join(directory, "trace.json")) as profiler:
+        function()
+
+    return {
+        stage.pop("name"): {key: round(value, 3) for key, value in stage.items()}
+        for stage in profiler.aggregates()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--frames", type=int, default=5)
+    parser.add_argument("--fade", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    src, dst = rng.integers(0, 256, (2, args.height, args.width, 3), dtype="uint8")
+
+    legacy = _time(lambda: _legacy_fade(src, dst, args.fade), args.repeat)
+    vectorized = _time(lambda: _crossfade(src, dst, args.fade), args.repeat)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for step in range(args.frames):
+            Image.fromarray(
+                rng.integers(0, 256, (args.height, args.width, 3), dtype="uint8")
+            ).save(os.path.join(directory, f"0000-{step:03d}.png"))
+
+        images = list_dir(directory)
+        output = os.path.join(directory, "animation")
+
+        gif = _time(lambda: GIFAnimator().generate(images, output, 1), args.repeat)
+        gif_size = os.path.getsize(output + ".gif")
+        gif_frame_palette = _time(
+            lambda: GIFAnimator(global_palette=False).generate(images, output, 1),
+            args.repeat,
+        )
+        gif_frame_palette_size = os.path.getsize(output + ".gif")
+        mp4 = _time(lambda: MP4Animator().generate(images, output, 1), args.repeat)
+        gif_parallel = _time(
+            lambda: GIFAnimator().generate(images, output, 1, workers=args.workers),
+            args.repeat,
+        )
+        mp4_parallel = _time(
+            lambda: MP4Animator().generate(images, output, 1, workers=args.workers),
+            args.repeat,
+        )
+
+        gif_allocated = _fade_frame_allocations(GIFAnimator(), images)
+        mp4_allocated = _fade_frame_allocations(MP4Animator(), images)
+
+        gif_stages = _stages(
+            lambda: GIFAnimator().generate(images, output, 1), directory
+        )
+        mp4_stages = _stages(
+            lambda: MP4Animator().generate(images, output, 1), directory
+        )
+
+    # The animations fade at generate's defaults of 30 fps for 1 second, and
+    # held frames count once as they are encoded once
+    frames = args.frames + (args.frames - 1) * 30
+
+    print(
+        json.dumps(
+            {
+                "benchmark": "animators",
+                "width": args.width,
+                "height": args.height,
+                "frames": args.frames,
+                "fade_frames": args.fade,
+                "legacy_fade_fps": float(args.fade / np.median(legacy)),
+                "crossfade_fps": float(args.fade / np.median(vectorized)),
+                "speedup": float(np.median(legacy) / np.median(vectorized)),
+                "gif_seconds": float(np.median(gif)),
+                "gif_frames_per_second": float(frames / np.median(gif)),
+                "gif_bytes": gif_size,
+                "gif_frame_palette_seconds": float(np.median(gif_frame_palette)),
+                "gif_frame_palette_bytes": gif_frame_palette_size,
+                "mp4_seconds": float(np.median(mp4)),
+                "mp4_frames_per_second": float(frames / np.median(mp4)),
+                "workers": args.workers,
+                "gif_parallel_seconds": float(np.median(gif_parallel)),
+                "mp4_parallel_seconds": float(np.median(mp4_parallel)),
+                "gif_bytes_allocated_per_fade_frame": gif_allocated,
+                "mp4_bytes_allocated_per_fade_frame": mp4_allocated,
+                "gif_stages": gif_stages,
+                "mp4_stages": mp4_stages,
+                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                / 1024,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
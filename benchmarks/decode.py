@@ -0,0 +1,69 @@
+"""
+Compare the VAE decoder against the approximate preview decoder.
+
+The real decoder is built without downloading weights; random weights run the
+same amount of compute, so the timings match the pretrained model.
+
+Usage:
+    python -m benchmarks.decode --width 512 --height 512 --repeat 5
+"""
+
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+import numpy as np
+from keras_cv.src.models.stable_diffusion.decoder import Decoder
+
+from sda.models.decoding import approximate_decode
+
+
+def _time(function, repeat: int) -> list[float]:
+    function()  # warm up
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    latent = np.random.default_rng(0).standard_normal(
+        (args.batch, args.height // 8, args.width // 8, 4), dtype="float32"
+    )
+    decoder = Decoder(args.height, args.width, download_weights=False)
+
+    vae = _time(lambda: decoder.predict_on_batch(latent), args.repeat)
+    fast = _time(lambda: approximate_decode(latent), args.repeat)
+
+    print(
+        json.dumps(
+            {
+                "benchmark": "decode",
+                "width": args.width,
+                "height": args.height,
+                "batch": args.batch,
+                "vae_seconds": float(np.median(vae)),
+                "fast_seconds": float(np.median(fast)),
+                "speedup": float(np.median(vae) / np.median(fast)),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
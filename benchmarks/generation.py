@@ -0,0 +1,260 @@
+"""
+Measure the generation loop, callbacks and image saving on a stub model.
+
+The text encoder, UNet and decoder are the tiny stand-ins from
+`benchmarks.stub_model`, so the timings cover everything around the model: the
+sampler, guidance, sweeps, deferred decoding, callbacks and the image writer.
+Each scenario runs in a fresh interpreter so its peak memory is its own, and
+is run once to trace the stub models before the measured repeats.
+
+The parity checks compare images that must match: fused and unfused guidance,
+batched and unbatched seeds, and a sweep against separate runs.
+
+Usage:
+    python -m benchmarks.generation --width 512 --height 512 --steps 10 --repeat 3
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+import numpy as np
+
+SCENARIOS: tuple[str, ...] = (
+    "preview",
+    "preview_batch",
+    "generate_sweep",
+    "generate_sequential",
+    "parity",
+)
+
+# The most uint8 levels images that should match may differ by, for rounding
+PARITY_TOLERANCE: int = 1
+
+PROMPT: tuple[str, str, float] = ("a misty forest at dawn", "text, watermark", 7.5)
+
+
+def _percentiles(values: list[float]) -> dict:
+    return {
+        f"p{percent}": float(np.percentile(values, percent)) for percent in (50, 90, 99)
+    }
+
+
+def _run(model: any, scenario: str, args: argparse.Namespace, save: any) -> int:
+    from sda.jobs import run_generate, run_preview
+
+    include, exclude, adherence = PROMPT
+    quiet = lambda *parts: None
+
+    if scenario.startswith("preview"):
+        return run_preview(
+            model,
+            list(range(1, args.images + 1)),
+            [args.steps],
+            include,
+            exclude,
+            adherence,
+            save=save,
+            say=quiet,
+            batch=args.batch if scenario == "preview_batch" else 1,
+            sampler=args.sampler,
+        )
+
+    external = run_generate(
+        model,
+        1,
+        args.steps,
+        include,
+        exclude,
+        adherence,
+        save=save,
+        say=quiet,
+        sweep=scenario == "generate_sweep",
+        sampler=args.sampler,
+    )
+
+    # Only the external frames are counted, and there is an internal frame per step
+    return external + args.steps
+
+
+def _measure(scenario: str, args: argparse.Namespace) -> dict:
+    from benchmarks.stub_model import stub_model
+    from sda.utilities.images import ImageWriter
+    from sda.utilities.profiling import profiling
+
+    model = stub_model(args.width, args.height)
+    runs, intervals = [], []
+
+    with tempfile.TemporaryDirectory() as directory:
+        with ImageWriter(compress_level=args.compress_level) as writer:
+            saved = []
+
+            def save(image: any, seed: int, step: int, output_dir: str) -> None:
+                saved.append(time.perf_counter())
+                writer.save(image, seed, step, os.path.join(directory, output_dir))
+
+            # The first run traces the stub models for every batch shape
+            _run(model, scenario, args, save)
+            writer.flush()
+
+            with profiling(os.path.join(directory, "trace.json")) as profiler:
+                for _ in range(args.repeat):
+                    saved.clear()
+                    started = time.perf_counter()
+                    count = _run(model, scenario, args, save)
+                    writer.flush()
+                    runs.append(time.perf_counter() - started)
+                    intervals += np.diff([started, *saved]).tolist()
+
+    stages = {
+        stage.pop("name"): {key: round(value, 3) for key, value in stage.items()}
+        for stage in profiler.aggregates()
+    }
+
+    return {
+        "images": count,
+        "run_seconds": _percentiles(runs),
+        "images_per_second": float(count / np.median(runs)),
+        "image_interval_ms": {
+            key: value * 1000 for key, value in _percentiles(intervals).items()
+        },
+        "stages": stages,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def _difference(images: list, others: list) -> int:
+    return max(
+        int(np.abs(np.asarray(a, "int16") - np.asarray(b, "int16")).max())
+        for a, b in zip(images, others)
+    )
+
+
+def _parity(args: argparse.Namespace) -> dict:
+    from benchmarks.stub_model import stub_model
+
+    model = stub_model(args.width, args.height)
+    include, exclude, adherence = PROMPT
+    options = {
+        "include_prompt": include,
+        "exclude_prompt": exclude,
+        "unconditional_guidance_scale": adherence,
+        "sampler": args.sampler,
+    }
+    seeds = list(range(1, args.batch + 1))
+    step_counts = sorted({max(args.steps // 2, 1), args.steps})
+
+    fused = model.generate_image(num_steps=args.steps, seed=seeds, **options)
+    unfused = model.generate_image(
+        num_steps=args.steps, seed=seeds, fused_guidance=False, **options
+    )
+    single = [
+        model.generate_image(num_steps=args.steps, seed=seed, **options)
+        for seed in seeds
+    ]
+    sweep = model.generate_sweep(step_counts=step_counts, seed=1, **options)
+    separate = [
+        model.generate_image(num_steps=steps, seed=1, **options)
+        for steps in step_counts
+    ]
+
+    checks = {
+        "fused_guidance_max_diff": _difference(fused, unfused),
+        "batch_max_diff": _difference(fused, single),
+        "sweep_max_diff": _difference(
+            [sweep[steps] for steps in step_counts], separate
+        ),
+    }
+
+    return {
+        **checks,
+        "tolerance": PARITY_TOLERANCE,
+        "passed": all(value <= PARITY_TOLERANCE for value in checks.values()),
+    }
+
+
+def _child(args: argparse.Namespace) -> None:
+    # Progress bars go to stdout, so the result is written to a file
+    if args.scenario == "parity":
+        result = _parity(args)
+    else:
+        result = _measure(args.scenario, args)
+
+    with open(args.result, "w") as file:
+        json.dump(result, file)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--width", type=int, default=512)
+    parser.add_argument("--height", type=int, default=512)
+    parser.add_argument("--steps", type=int, default=10)
+    parser.add_argument("--images", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--sampler", default="ddim")
+    parser.add_argument("--compress-level", type=int, default=6)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        _child(args)
+        return
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for scenario in args.scenarios.split(","):
+            if scenario not in SCENARIOS:
+                parser.error(f"unknown scenario: {scenario}")
+
+            result = os.path.join(directory, f"{scenario}.json")
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.generation",
+                    *sys.argv[1:],
+                    "--scenario",
+                    scenario,
+                    "--result",
+                    result,
+                ],
+                cwd=root,
+                stdout=subprocess.DEVNULL,
+                check=True,
+            )
+
+            with open(result) as file:
+                results[scenario] = json.load(file)
+
+    print(
+        json.dumps(
+            {
+                "benchmark": "generation",
+                "width": args.width,
+                "height": args.height,
+                "steps": args.steps,
+                "images": args.images,
+                "batch": args.batch,
+                "repeat": args.repeat,
+                "sampler": args.sampler,
+                **results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Measure the import time and peak memory of each sda subcommand.
+
+Each command runs in a fresh interpreter inside an empty project directory.
+Commands that need model weights are measured with --help, which covers the
+CLI startup cost without generating anything.
+
+Usage:
+    python -m benchmarks.startup --repeat 3
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+COMMANDS: dict[str, list[str]] = {
+    "setup": ["setup"],
+    "animate": ["animate", "--gif"],
+    "preview": ["preview", "--help"],
+    "generate": ["generate", "--help"],
+    "serve": ["serve", "--help"],
+}
+
+# Runs inside the child interpreter and reports its own measurements
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+from sda.app import app
+imported = time.perf_counter()
+sys.argv = ["sda", *sys.argv[1:]]
+try:
+    app()
+except SystemExit:
+    pass
+print(json.dumps({
+    "import_seconds": imported - started,
+    "total_seconds": time.perf_counter() - started,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "tensorflow_loaded": "tensorflow" in sys.modules,
+}), file=sys.stderr)
+"""
+
+
+def _measure(arguments: list[str], directory: str) -> dict:
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE, *arguments],
+        cwd=directory,
+        env={**os.environ, "PYTHONPATH": root},
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    results = {}
+    for name, arguments in COMMANDS.items():
+        with tempfile.TemporaryDirectory() as directory:
+            runs = [_measure(arguments, directory) for _ in range(args.repeat)]
+
+        results[name] = {
+            "import_seconds": float(np.median([run["import_seconds"] for run in runs])),
+            "total_seconds": float(np.median([run["total_seconds"] for run in runs])),
+            "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+            "tensorflow_loaded": any(run["tensorflow_loaded"] for run in runs),
+        }
+
+    print(json.dumps({"benchmark": "startup", "commands": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Tiny deterministic stand-ins for the Stable Diffusion components.
+
+The text encoder, UNet and decoder take and return tensors of the same shapes
+as the real ones, so everything around them runs unchanged, but they are a few
+small layers with seeded weights and need no download. The tokenizer hashes
+words into token ids instead of loading the CLIP vocabulary.
+"""
+
+import os
+import zlib
+
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+
+from keras_cv.src.models.stable_diffusion.stable_diffusion import MAX_PROMPT_LENGTH
+from tensorflow import keras
+
+from sda.models.embeddings import EmbeddingCache
+from sda.models.stable_diffusion import StableDiffusionWriter
+
+VOCABULARY_SIZE: int = 49408
+START_TOKEN: int = 49406
+END_TOKEN: int = 49407
+
+
+class StubTokenizer:
+    """
+    Maps each word of a prompt to a stable token id.
+    """
+
+    def encode(self, prompt: str) -> list[int]:
+        words = prompt.lower().split()[: MAX_PROMPT_LENGTH - 2]
+        tokens = [zlib.crc32(word.encode()) % START_TOKEN for word in words]
+        return [START_TOKEN, *tokens, END_TOKEN]
+
+
+def _text_encoder() -> keras.Model:
+    tokens = keras.Input((MAX_PROMPT_LENGTH,), dtype="int32", name="tokens")
+    positions = keras.Input((MAX_PROMPT_LENGTH,), dtype="int32", name="positions")
+
+    x = keras.layers.Embedding(VOCABULARY_SIZE, 8)(tokens)
+    x = x + keras.layers.Embedding(MAX_PROMPT_LENGTH, 8)(positions)
+    return keras.Model([tokens, positions], keras.layers.Dense(768)(x))
+
+
+def _diffusion_model(latent_height: int, latent_width: int) -> keras.Model:
+    latent = keras.Input((latent_height, latent_width, 4), name="latent")
+    t_emb = keras.Input((320,), name="timestep_embedding")
+    context = keras.Input((MAX_PROMPT_LENGTH, 768), name="context")
+
+    condition = keras.layers.Dense(4)(keras.layers.GlobalAveragePooling1D()(context))
+    condition = keras.layers.Reshape((1, 1, 4))(
+        condition + keras.layers.Dense(4)(t_emb)
+    )
+    residual = keras.layers.Conv2D(4, 3, padding="same")(latent) + condition
+
+    # Predicting mostly the latent itself keeps every sampler numerically stable
+    noise = 0.9 * latent + 0.1 * keras.activations.tanh(residual)
+    return keras.Model([latent, t_emb, context], noise)
+
+
+def _decoder(latent_height: int, latent_width: int) -> keras.Model:
+    latent = keras.Input((latent_height, latent_width, 4))
+
+    x = keras.layers.Conv2D(3, 1)(latent)
+    x = keras.layers.UpSampling2D(8)(x)
+    x = keras.layers.Conv2D(3, 3, padding="same", activation="tanh")(x)
+    return keras.Model(latent, x)
+
+
+def stub_model(
+    width: int = 512, height: int = 512, seed: int = 0
+) -> StableDiffusionWriter:
+    """
+    Build a StableDiffusionWriter whose components are stubs.
+
+    Args:
+        width (int): The image width in pixels.
+        height (int): The image height in pixels.
+        seed (int): The seed of the stub weights.
+
+    Returns:
+        StableDiffusionWriter: The model, with an in-memory embedding cache as
+            `initialize_model` would set up.
+    """
+
+    model = StableDiffusionWriter(img_width=width, img_height=height, jit_compile=False)
+    latent_height, latent_width = model.img_height // 8, model.img_width // 8
+
+    keras.utils.set_random_seed(seed)
+    model._text_encoder = _text_encoder()
+    model._diffusion_model = _diffusion_model(latent_height, latent_width)
+    model._decoder = _decoder(latent_height, latent_width)
+    model._tokenizer = StubTokenizer()
+
+    # Stub embeddings and images must never mix with those of the real model
+    model.text_encoder_id = "stub-text-encoder"
+    model.model_id = "stub-stable-diffusion"
+    model.embedding_cache = EmbeddingCache(model.text_encoder_id)
+
+    return model
@@ -1,10 +1,38 @@
 import abc
+import multiprocessing
 import os
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Iterator
 
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from PIL import Image
+
+from .crossfade import crossfade
+from .sources import SharedSources, resolved
+from .tags import tag_image, tag_position
+from ..utilities.images import ImageFile
+from ..utilities.profiling import span, timed
 
 FONT_FILEPATH: str = "assets/LeagueSpartan-Bold.otf"
 
+# The number of fade frames rendered by a single parallel task
+SEGMENT_SIZE: int = 8
+
+
+def _in_order(futures: Iterator[Future], depth: int) -> Iterator[any]:
+    # Futures are pulled from a lazy generator, so at most `depth` are in flight
+    pending = deque()
+
+    for future in futures:
+        pending.append(future)
+        if len(pending) >= depth:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
 
 class BaseAnimator(abc.ABC):
 
@@ -12,93 +40,273 @@ class BaseAnimator(abc.ABC):
     _fade_count: int = 30
     _frame_time: int = round(1000 / 30)
 
-    def __init__(self, font_file: str = FONT_FILEPATH, font_size: int = 14) -> None:
-        self._font = ImageFont.truetype(
-            os.path.abspath(os.path.join(os.path.dirname(__file__), "..", font_file)),
-            font_size,
+    # Encoders that copy each frame before the next one is requested can have
+    # every fade frame rendered into a single reused buffer
+    _reuse_frames: bool = False
+
+    # Encoders that store the difference to the previous frame get it in _encode
+    _diff_frames: bool = False
+
+    def __init__(
+        self,
+        font_file: str = FONT_FILEPATH,
+        font_size: int = 14,
+        sources: SharedSources | None = None,
+    ) -> None:
+        self._font_file = os.path.abspath(
+            os.path.join(os.path.dirname(__file__), "..", font_file)
         )
+        self._font_size = font_size
+        self._sources = sources
+
+    def __getstate__(self) -> dict:
+        # Worker processes only render frames and never fetch sources
+        state = self.__dict__.copy()
+        state["_sources"] = None
+        return state
+
+    @staticmethod
+    def _order(count: int, loop: bool) -> list[int]:
+        # Looping plays the frames forwards and then backwards: 1,2,3,4,3,2
+        order = list(range(count))
+        if loop:
+            order = order + order[-2:0:-1]
+
+        return order
+
+    def _source(self, image: ImageFile, tag: int = 0) -> np.ndarray:
+        with span("animate.load"):
+            source = image.open()
+
+        with span("animate.draw"):
+            return np.asarray(self._draw(source, image.step, tag))
+
+    def _fetch(
+        self, image: ImageFile, tag: int, submit: Callable[[], Future], uses: int = 1
+    ) -> Future:
+        # Tagged sources are identical for every output format
+        if self._sources is None:
+            return submit()
+
+        return self._sources.fetch((image.path, tag), submit, uses)
 
     def _load(
         self,
-        images: list[tuple[Image.Image, int, int]],
+        images: list[ImageFile],
+        tag: int = 0,
+        loop: bool = False,
+    ) -> Iterator[np.ndarray]:
+        order = self._order(len(images), loop)
+        uses = Counter(order)
+
+        for index in order:
+            image = images[index]
+            frame = self._fetch(
+                image, tag, partial(resolved, self._source, image, tag), uses[index]
+            )
+            yield self._prepare(frame.result())
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Converts a tagged RGB source frame into the encoder's pixel format.
+
+        Fades are linear per channel, so converting the sources once is the same
+        as converting every fade frame.
+        """
+
+        return frame
+
+    def _frames(
+        self,
+        images: list[ImageFile],
         tag: int = 0,
         loop: bool = False,
-    ) -> list[Image.Image]:
-        images = [self._draw(image, frame, tag) for image, _, frame in images]
+    ) -> Iterator[tuple[np.ndarray, bool]]:
+        """
+        Yields each frame of the animation with True for held frames and False
+        for fade frames, keeping only a few frames in memory at a time.
+        """
+
+        frames = self._load(images, tag, loop)
+        first = image = next(frames)
+        out = np.empty_like(first) if self._reuse_frames else None
+
+        for next_image in frames:
+            yield image, True
+            for fade_image in timed(
+                "animate.fade", self._fade(image, next_image, self._fade_count, out)
+            ):
+                yield fade_image, False
+            image = next_image
+
+        yield image, True
 
         if loop:
-            images = images + images[-2:0:-1]
+            for fade_image in timed(
+                "animate.fade", self._fade(image, first, self._fade_count, out)
+            ):
+                yield fade_image, False
 
-        return images
+    def _encode(self, frame: np.ndarray, previous: np.ndarray | None) -> any:
+        """
+        Turns a frame into what the encoder writes. This runs in the workers
+        when rendering in parallel.
+        """
 
-    def _draw(self, image: Image.Image, step: int, tag: int = 0) -> Image.Image:
-        l, t, r, b = self._font.getbbox("00")
-
-        step_margin = 6
-        step_width = r - l + step_margin * 2
-        step_height = b - t + step_margin * 2
-
-        tag_image = Image.new("RGBA", (step_width, step_height), (45, 52, 54))
-        tag_draw = ImageDraw.Draw(tag_image)
-        tag_draw.text(
-            (step_width / 2, step_height / 2 + 2),
-            f"{step:02d}",
-            font=self._font,
-            fill=(223, 230, 233),
-            anchor="mm",
-        )
+        return frame
+
+    def _encoded_frames(
+        self,
+        images: list[ImageFile],
+        tag: int = 0,
+        loop: bool = False,
+        workers: int = 1,
+    ) -> Iterator[tuple[any, bool]]:
+        """
+        Yields each encoded frame of the animation with True for held frames,
+        rendering it across `workers` processes when there is more than one.
+        """
 
-        if tag == 1:
-            # top-right
-            image.paste(
-                tag_image,
-                (image.width - step_width - step_margin, step_margin),
-                tag_image,
+        if workers > 1:
+            yield from self._render(images, tag, loop, workers)
+            return
+
+        previous = None
+        for frame, held in self._frames(images, tag, loop):
+            with span("animate.encode"):
+                encoded = self._encode(frame, previous)
+
+            yield encoded, held
+            previous = frame if self._diff_frames else None
+
+    def _render(
+        self,
+        images: list[ImageFile],
+        tag: int,
+        loop: bool,
+        workers: int,
+    ) -> Iterator[tuple[any, bool]]:
+        # Pillow holds the GIL while quantizing, so the pool uses processes. They
+        # are spawned, since forking while other threads hold locks can deadlock
+        context = multiprocessing.get_context("spawn")
+        order = self._order(len(images), loop)
+        uses = Counter(order)
+
+        with ProcessPoolExecutor(workers, mp_context=context) as executor:
+            sources = map(
+                self._prepare,
+                _in_order(
+                    (
+                        self._fetch(
+                            images[index],
+                            tag,
+                            partial(executor.submit, self._source, images[index], tag),
+                            uses[index],
+                        )
+                        for index in order
+                    ),
+                    workers,
+                ),
             )
 
-        elif tag == 2:
-            # top-left
-            image.paste(tag_image, (step_margin, step_margin), tag_image)
+            # Frames are rendered in the workers, so only the wait for each
+            # segment is timed here
+            for segment in timed(
+                "animate.render",
+                _in_order(self._segments(executor, sources, loop), workers * 2),
+            ):
+                yield from segment
+
+    def _segments(
+        self,
+        executor: ProcessPoolExecutor,
+        sources: Iterator[np.ndarray],
+        loop: bool,
+    ) -> Iterator[Future]:
+        # Submits the same frame sequence as _frames, split into ordered tasks
+        before = None
+        first = image = next(sources)
+
+        for next_image in sources:
+            yield executor.submit(self._render_hold, before, image)
+            yield from self._submit_fade(executor, image, next_image)
+            before, image = image, next_image
 
-        elif tag == 3:
-            # bottom-left
-            image.paste(
-                tag_image,
-                (step_margin, image.height - step_height - step_margin),
-                tag_image,
+        yield executor.submit(self._render_hold, before, image)
+
+        if loop:
+            yield from self._submit_fade(executor, image, first)
+
+    def _submit_fade(
+        self, executor: ProcessPoolExecutor, src: np.ndarray, dst: np.ndarray
+    ) -> Iterator[Future]:
+        for start in range(0, self._fade_count, SEGMENT_SIZE):
+            stop = min(start + SEGMENT_SIZE, self._fade_count)
+            yield executor.submit(self._render_fade, src, dst, start, stop)
+
+    def _render_hold(
+        self, before: np.ndarray | None, image: np.ndarray
+    ) -> list[tuple[any, bool]]:
+        previous = before if self._diff_frames else None
+        if previous is not None and self._fade_count:
+            # The last fade frame into this image
+            previous = next(
+                crossfade(before, image, self._fade_count, start=self._fade_count - 1)
             )
 
-        elif tag == 4:
-            # bottom-right
-            image.paste(
-                tag_image,
-                (
-                    image.width - step_width - step_margin,
-                    image.height - step_height - step_margin,
-                ),
-                tag_image,
+        return [(self._encode(image, previous), True)]
+
+    def _render_fade(
+        self, src: np.ndarray, dst: np.ndarray, start: int, stop: int
+    ) -> list[tuple[any, bool]]:
+        frames = crossfade(src, dst, self._fade_count, start=start, stop=stop)
+        previous = None
+        if self._diff_frames:
+            previous = (
+                src
+                if start == 0
+                else next(crossfade(src, dst, self._fade_count, start=start - 1))
             )
 
+        segment = []
+        for frame in frames:
+            segment.append((self._encode(frame, previous), False))
+            previous = frame if self._diff_frames else None
+
+        return segment
+
+    def _draw(self, image: Image.Image, step: int, tag: int = 0) -> Image.Image:
+        if tag == 0:
+            return image
+
+        label = tag_image(f"{step:02d}", self._font_file, self._font_size)
+        position = tag_position(image.size, tag, label.size)
+
+        if position is not None:
+            image.paste(label, position, label)
+
         return image
 
     def _fade(
         self,
-        image_src: Image.Image,
-        image_dst: Image.Image,
+        image_src: np.ndarray,
+        image_dst: np.ndarray,
         count: int = 30,
-    ) -> list[Image.Image]:
-        return [Image.blend(image_src, image_dst, c / count) for c in range(count)]
+        out: np.ndarray | None = None,
+    ) -> Iterator[np.ndarray]:
+        return crossfade(image_src, image_dst, count, out)
 
     @abc.abstractmethod
     def generate(
         self,
-        images: list[tuple[Image.Image, int, int]],
+        images: list[ImageFile],
         filepath: str,
         tag: int = 0,
         loop: bool = False,
         fps: int = 30,
         hold_time: float = 0.5,
         fade_time: float = 1.0,
+        workers: int = 1,
     ) -> None:
         self._hold_count = round(fps * hold_time)
         self._fade_count = round(fps * fade_time)
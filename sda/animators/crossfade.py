@@ -0,0 +1,65 @@
+from typing import Iterator
+
+import numpy as np
+
+
+def fade_alphas(count: int) -> np.ndarray:
+    """
+    The blend factor of each fade frame, matching `Image.blend(src, dst, c / count)`.
+
+    Args:
+        count (int): The number of fade frames.
+
+    Returns:
+        np.ndarray: The float32 blend factors shaped (count,).
+    """
+
+    return (np.arange(count) / count).astype("float32")
+
+
+def crossfade(
+    src: np.ndarray,
+    dst: np.ndarray,
+    count: int,
+    out: np.ndarray | None = None,
+    start: int = 0,
+    stop: int | None = None,
+) -> Iterator[np.ndarray]:
+    """
+    Blend two uint8 frames into `count` fade frames.
+
+    Each frame is a scaled add of a precomputed float32 delta into a reused
+    buffer, which keeps the working set in cache. The arithmetic matches
+    `Image.blend`, including its truncation to uint8, so the frames are
+    identical to Pillow's.
+
+    With `out`, every frame is written into that buffer and the buffer itself is
+    yielded, so the fade allocates nothing per frame. Each frame must then be
+    consumed before the next one is requested.
+
+    Args:
+        src (np.ndarray): The frame the fade starts from, shaped (height, width, 3).
+        dst (np.ndarray): The frame the fade ends at, shaped like `src`.
+        count (int): The number of fade frames.
+        out (np.ndarray, optional): A uint8 buffer shaped like `src` to reuse.
+        start (int): The first fade frame to produce.
+        stop (int, optional): The fade frame to stop before, `count` by default.
+
+    Returns:
+        Iterator[np.ndarray]: The fade frames, where frame 0 is `src` itself.
+    """
+
+    src_float = src.astype("float32")
+    delta = dst.astype("float32") - src_float
+    blend = np.empty_like(src_float)
+
+    for alpha in fade_alphas(count)[start:stop]:
+        # An alpha below 1 keeps the result between src and dst, so no clipping
+        np.multiply(delta, alpha, out=blend)
+        blend += src_float
+
+        if out is None:
+            yield blend.astype("uint8")
+        else:
+            np.copyto(out, blend, casting="unsafe")
+            yield out
@@ -1,43 +1,67 @@
-from PIL.Image import Image
+import numpy as np
 
 from .base_animator import BaseAnimator
+from .gif_writer import EncodedFrame, GIFWriter, encode_frame
+from .palette import Palette
+from ..utilities.images import ImageFile
+from ..utilities.profiling import span
+
+# The number of source images the global palette is built from
+PALETTE_SAMPLES: int = 8
 
 
 class GIFAnimator(BaseAnimator):
 
+    _diff_frames = True
+
+    def __init__(
+        self, *args, global_palette: bool = True, dither: bool = False, **kwargs
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._global_palette = global_palette
+        self._dither = dither
+        self._palette = None
+
+    def _build_palette(self, images: list[ImageFile], tag: int) -> Palette:
+        samples = np.unique(
+            np.linspace(0, len(images) - 1, min(len(images), PALETTE_SAMPLES))
+            .round()
+            .astype(int)
+        )
+        return Palette.from_samples(
+            [self._source(images[index], tag) for index in samples], self._dither
+        )
+
+    def _encode(
+        self, frame: np.ndarray, previous: np.ndarray | None
+    ) -> EncodedFrame | None:
+        return encode_frame(frame, previous, self._palette)
+
     def generate(
         self,
-        images: list[tuple[Image, int, int]],
+        images: list[ImageFile],
         filename: str,
         tag: int = 0,
         loop: bool = False,
         fps: int = 30,
         hold_time: float = 0.5,
         fade_time: float = 1.0,
+        workers: int = 1,
     ) -> None:
-        super().generate(images, filename, tag, loop, fps, hold_time, fade_time)
-
-        images = self._load(images, tag, loop)
-        frames: list[Image] = []
-        durations: list[int] = []
-
-        for index, image in enumerate(images):
-            frames.append(image)
-            durations.append(hold_time * 1000)
-
-            if not loop and image == images[-1]:
-                break
-
-            next_image = images[(index + 1) % len(images)]
-            fade_images = self._fade(image, next_image, self._fade_count)
+        super().generate(
+            images, filename, tag, loop, fps, hold_time, fade_time, workers
+        )
 
-            frames.extend(fade_images)
-            durations.extend([self._frame_time] * len(fade_images))
+        with span("animate.palette"):
+            self._palette = (
+                self._build_palette(images, tag) if self._global_palette else None
+            )
 
-        frames[0].save(
-            filename + ".gif",
-            save_all=True,
-            append_images=frames[1:],
-            duration=durations,
-            loop=0 if loop else 1,
-        )
+        with GIFWriter(
+            filename + ".gif", loop=0 if loop else 1, palette=self._palette
+        ) as writer:
+            for frame, held in self._encoded_frames(images, tag, loop, workers):
+                with span("animate.write"):
+                    writer.write_encoded(
+                        frame, hold_time * 1000 if held else self._frame_time
+                    )
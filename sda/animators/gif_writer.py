@@ -0,0 +1,197 @@
+from typing import NamedTuple
+
+import numpy as np
+from PIL import GifImagePlugin, Image
+
+from .palette import TRANSPARENT_INDEX, Palette
+
+
+def _changed_bbox(
+    image: np.ndarray, previous: np.ndarray
+) -> tuple[int, int, int, int] | None:
+    changed = image != previous
+    if changed.ndim == 3:
+        changed = changed.any(axis=2)
+    rows = np.flatnonzero(changed.any(axis=1))
+    if not rows.size:
+        return None
+
+    cols = np.flatnonzero(changed.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+class EncodedFrame(NamedTuple):
+    """
+    The quantized region of a frame that differs from the previous frame.
+    """
+
+    image: Image.Image
+    offset: tuple[int, int]
+
+
+def encode_frame(
+    image: np.ndarray,
+    previous: np.ndarray | None = None,
+    palette: Palette | None = None,
+) -> EncodedFrame | None:
+    """
+    Crop a frame to the region that changed and quantize it to a palette.
+
+    This is the expensive part of writing a GIF and depends only on the frame
+    and its predecessor, so it can run in parallel ahead of the writer.
+
+    Without a palette the region gets its own adaptive palette. With a global
+    palette the frames are diffed after mapping, and pixels inside the region
+    that did not change are made transparent so they compress to almost nothing.
+
+    Args:
+        image (np.ndarray): The uint8 RGB frame.
+        previous (np.ndarray, optional): The frame shown before it, if any.
+        palette (Palette, optional): The palette shared by every frame.
+
+    Returns:
+        EncodedFrame | None: The encoded region, or None if nothing changed.
+    """
+
+    if palette is not None:
+        # The previous frame is mapped first since it was usually just mapped
+        previous = None if previous is None else palette.map(previous)
+        return _encode_indexed(palette.map(image), previous)
+
+    if previous is None:
+        bbox = (0, 0, image.shape[1], image.shape[0])
+    else:
+        bbox = _changed_bbox(image, previous)
+
+    if bbox is None:
+        return None
+
+    left, top, right, bottom = bbox
+    frame = Image.fromarray(image[top:bottom, left:right]).convert(
+        "P", palette=Image.Palette.ADAPTIVE
+    )
+    return EncodedFrame(frame, (left, top))
+
+
+def _encode_indexed(
+    indices: np.ndarray, previous: np.ndarray | None
+) -> EncodedFrame | None:
+    if previous is None:
+        bbox = (0, 0, indices.shape[1], indices.shape[0])
+    else:
+        bbox = _changed_bbox(indices, previous)
+
+    if bbox is None:
+        return None
+
+    left, top, right, bottom = bbox
+    region = indices[top:bottom, left:right]
+    if previous is not None:
+        unchanged = region == previous[top:bottom, left:right]
+        region = np.where(unchanged, np.uint8(TRANSPARENT_INDEX), region)
+
+    # Converting from L keeps the values, which are the palette indices
+    return EncodedFrame(Image.fromarray(region).convert("P"), (left, top))
+
+
+class GIFWriter:
+    """
+    Encodes a GIF one frame at a time instead of collecting every frame first.
+
+    Like Pillow's own GIF writer, identical consecutive frames are merged into one
+    longer frame and changed frames only store the region that differs from the
+    previous frame. At most two frames are held in memory.
+
+    With a global palette, the palette is written once in the header and every
+    frame is drawn over the previous one, with unchanged pixels left transparent.
+    """
+
+    def __init__(
+        self, filepath: str, loop: int = 0, palette: Palette | None = None
+    ) -> None:
+        self._file = open(filepath, "wb")
+        self._loop = loop
+        self._palette = palette
+        self._previous: np.ndarray | None = None
+        self._pending: tuple[EncodedFrame, float] | None = None
+        self._started = False
+
+    def __enter__(self) -> "GIFWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, image: np.ndarray, duration: float) -> None:
+        """
+        Add a frame to the GIF.
+
+        Args:
+            image (np.ndarray): The uint8 RGB frame, the same size as every other frame.
+            duration (float): How long the frame is shown in milliseconds.
+        """
+
+        self.write_encoded(encode_frame(image, self._previous, self._palette), duration)
+        self._previous = image
+
+    def write_encoded(self, frame: EncodedFrame | None, duration: float) -> None:
+        """
+        Add a frame that was already passed through `encode_frame`.
+
+        Args:
+            frame (EncodedFrame | None): The encoded frame, or None if it is
+                identical to the previous frame.
+            duration (float): How long the frame is shown in milliseconds.
+        """
+
+        if frame is None:
+            pending, pending_duration = self._pending
+            self._pending = (pending, pending_duration + duration)
+            return
+
+        self._flush()
+        self._pending = (frame, duration)
+
+    def close(self) -> None:
+        """
+        Write the last frame and the GIF trailer, and close the file.
+        """
+
+        if self._file.closed:
+            return
+
+        try:
+            self._flush()
+            if self._started:
+                self._file.write(b";")
+        finally:
+            self._file.close()
+
+    def _flush(self) -> None:
+        if self._pending is None:
+            return
+
+        (frame, offset), duration = self._pending
+        self._pending = None
+
+        if not self._started:
+            self._write_header(frame)
+
+        if self._palette is None:
+            params = {"include_color_table": True}
+        else:
+            # Keep the previous frame and draw over it
+            params = {"transparency": TRANSPARENT_INDEX, "disposal": 1}
+
+        for chunk in GifImagePlugin.getdata(frame, offset, duration=duration, **params):
+            self._file.write(chunk)
+
+    def _write_header(self, frame: Image.Image) -> None:
+        # The first frame always covers the whole canvas
+        if self._palette is not None:
+            frame = Image.new("P", frame.size)
+            frame.putpalette(self._palette.palette_bytes())
+
+        header, _ = GifImagePlugin.getheader(frame, info={"loop": self._loop})
+        self._file.write(b"".join(header))
+        self._started = True
@@ -5,47 +5,50 @@ from cv2 import (
     destroyAllWindows,
     COLOR_RGB2BGR,
 )
-from numpy import array as np_array
-from PIL.Image import Image
+from numpy import ndarray
 
 from .base_animator import BaseAnimator
+from ..utilities.images import ImageFile
+from ..utilities.profiling import span
 
 
 class MP4Animator(BaseAnimator):
 
-    def _convert(self, image: Image) -> any:
-        return cvtColor(np_array(image), COLOR_RGB2BGR)
+    _reuse_frames = True
+
+    def _prepare(self, frame: ndarray) -> ndarray:
+        return cvtColor(frame, COLOR_RGB2BGR)
 
     def generate(
         self,
-        images: list[tuple[Image, int, int]],
+        images: list[ImageFile],
         filepath: str,
         tag: int = 0,
         loop: bool = False,
         fps: int = 30,
         hold_time: float = 0.5,
         fade_time: float = 1.0,
+        workers: int = 1,
     ) -> None:
-        super().generate(images, filepath, tag, loop, fps, hold_time, fade_time)
-
-        images = self._load(images, tag, loop)
-        video = VideoWriter(
-            filepath + ".mp4",
-            VideoWriter_fourcc(*"mp4v"),
-            fps,
-            images[0].size,
+        super().generate(
+            images, filepath, tag, loop, fps, hold_time, fade_time, workers
         )
 
-        for index, image in enumerate(images):
-            for _ in range(self._hold_count):
-                video.write(self._convert(image))
-
-            if not loop and index == len(images) - 1:
-                break
-
-            next_image = images[(index + 1) % len(images)]
-            for fade_frame in self._fade(image, next_image, self._fade_count):
-                video.write(self._convert(fade_frame))
+        video = None
+
+        for frame, held in self._encoded_frames(images, tag, loop, workers):
+            if video is None:
+                video = VideoWriter(
+                    filepath + ".mp4",
+                    VideoWriter_fourcc(*"mp4v"),
+                    fps,
+                    (frame.shape[1], frame.shape[0]),
+                )
+
+            # Held frames are written repeatedly from the same converted buffer
+            with span("animate.write"):
+                for _ in range(self._hold_count if held else 1):
+                    video.write(frame)
 
         destroyAllWindows()
         video.release()
@@ -0,0 +1,127 @@
+import numpy as np
+from PIL import Image
+
+# Index 255 is left out of the palette so frames can use it for transparency
+PALETTE_SIZE: int = 255
+TRANSPARENT_INDEX: int = 255
+
+# Colors are looked up on a 32 x 32 x 32 grid, 8 values per step
+LUT_BITS: int = 5
+LUT_STEP: int = 256 >> LUT_BITS
+
+SAMPLE_STRIDE: int = 2
+
+
+def _bayer(size: int) -> np.ndarray:
+    matrix = np.zeros((1, 1), dtype="int16")
+    while matrix.shape[0] < size:
+        matrix = np.block(
+            [[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]]
+        )
+
+    return matrix
+
+
+# Ordered dithering offsets spanning one lookup step, centered on zero
+BAYER_OFFSETS: np.ndarray = (_bayer(8) * LUT_STEP // 64 - LUT_STEP // 2)[:, :, None]
+
+
+class Palette:
+    """
+    A single adaptive palette shared by every frame of a GIF.
+
+    Frames are mapped to the palette with a precomputed nearest-color lookup
+    table, optionally with ordered dithering. Ordered dithering depends only on
+    the pixel position, so regions that do not change between frames map to the
+    same indices and stay transparent in frame differences.
+    """
+
+    def __init__(self, colors: np.ndarray, dither: bool = False) -> None:
+        self.colors = np.asarray(colors, dtype="uint8")
+        self.dither = dither
+        self._lut = self._nearest(self.colors)
+        self._last: tuple[np.ndarray, np.ndarray] | None = None
+
+    def __getstate__(self) -> dict:
+        # Keep the last mapped frame out of what is sent to worker processes
+        state = self.__dict__.copy()
+        state["_last"] = None
+        return state
+
+    @classmethod
+    def from_samples(cls, samples: list[np.ndarray], dither: bool = False) -> "Palette":
+        """
+        Build a palette from a sample of the source frames.
+
+        Args:
+            samples (list[np.ndarray]): uint8 RGB frames to take the colors from.
+            dither (bool): Apply ordered dithering when mapping frames.
+
+        Returns:
+            Palette: The palette of up to PALETTE_SIZE colors.
+        """
+
+        pixels = np.concatenate(
+            [
+                sample[::SAMPLE_STRIDE, ::SAMPLE_STRIDE].reshape(-1, 3)
+                for sample in samples
+            ]
+        )
+        quantized = Image.fromarray(pixels[:, None, :]).quantize(PALETTE_SIZE)
+        colors = np.array(quantized.getpalette()[: PALETTE_SIZE * 3], dtype="uint8")
+
+        return cls(colors.reshape(-1, 3), dither)
+
+    @staticmethod
+    def _nearest(colors: np.ndarray) -> np.ndarray:
+        steps = np.arange(0, 256, LUT_STEP, dtype="float32") + LUT_STEP / 2
+        grid = np.stack(np.meshgrid(steps, steps, steps, indexing="ij"), axis=-1)
+        grid = grid.reshape(-1, 3)
+        colors = colors.astype("float32")
+
+        # |grid - color|^2 minus |grid|^2, which is the same for every color
+        distances = (colors**2).sum(axis=1)[None, :] - 2 * grid @ colors.T
+        return distances.argmin(axis=1).astype("uint8")
+
+    def palette_bytes(self) -> bytes:
+        """
+        The palette as 256 RGB triplets, with the transparent index left black.
+
+        Returns:
+            bytes: The 768 byte palette.
+        """
+
+        palette = np.zeros((256, 3), dtype="uint8")
+        palette[: len(self.colors)] = self.colors
+        return palette.tobytes()
+
+    def map(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Map a frame to palette indices.
+
+        Args:
+            frame (np.ndarray): The uint8 RGB frame.
+
+        Returns:
+            np.ndarray: The uint8 palette index of every pixel.
+        """
+
+        # Frames are mapped twice in a row when diffing against the previous one
+        if self._last is not None and self._last[0] is frame:
+            return self._last[1]
+
+        pixels = frame
+        if self.dither:
+            height, width = frame.shape[:2]
+            offsets = np.tile(BAYER_OFFSETS, (height // 8 + 1, width // 8 + 1, 1))
+            pixels = frame + offsets[:height, :width]
+            pixels = np.clip(pixels, 0, 255, out=pixels).astype("uint8")
+
+        steps = (pixels >> (8 - LUT_BITS)).astype("uint16")
+        index = steps[:, :, 0] << (2 * LUT_BITS)
+        index |= steps[:, :, 1] << LUT_BITS
+        index |= steps[:, :, 2]
+
+        indices = self._lut[index]
+        self._last = (frame, indices)
+        return indices
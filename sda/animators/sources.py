@@ -0,0 +1,69 @@
+import threading
+from concurrent.futures import Future
+from typing import Callable, Hashable
+
+
+def resolved(function: Callable[..., any], *args: any) -> Future:
+    """
+    Run a function now and wrap its result in a finished future.
+
+    Args:
+        function (Callable[..., any]): The function to run.
+        *args (any): The arguments passed to the function.
+
+    Returns:
+        Future: A future holding the result or the raised exception.
+    """
+
+    future = Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as error:
+        future.set_exception(error)
+
+    return future
+
+
+class SharedSources:
+    """
+    Tagged source frames shared by animators built from the same images.
+
+    The first animator to ask for a frame loads it and the others wait on the
+    same future. A frame is dropped once every consumer has fetched it as many
+    times as it uses it, so animators running side by side only hold the frames
+    between the fastest and the slowest of them.
+    """
+
+    def __init__(self, consumers: int) -> None:
+        self.consumers = consumers
+        self.loads = 0
+        self._entries: dict[Hashable, list] = {}
+        self._lock = threading.Lock()
+
+    def fetch(
+        self, key: Hashable, submit: Callable[[], Future], uses: int = 1
+    ) -> Future:
+        """
+        Return the future for a frame, starting its load on the first fetch.
+
+        Args:
+            key (Hashable): Identifies the frame, such as its path and tag.
+            submit (Callable[[], Future]): Starts loading the frame.
+            uses (int): How many times each consumer fetches the frame, such as
+                twice for the middle frames of a loop.
+
+        Returns:
+            Future: A future for the loaded frame.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [submit(), uses * self.consumers]
+                self.loads += 1
+
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._entries[key]
+
+            return entry[0]
@@ -0,0 +1,82 @@
+from functools import lru_cache
+
+from PIL import Image, ImageDraw, ImageFont
+
+TAG_MARGIN: int = 6
+TAG_BACKGROUND: tuple[int, int, int] = (45, 52, 54)
+TAG_FOREGROUND: tuple[int, int, int] = (223, 230, 233)
+TAG_CACHE_SIZE: int = 256
+
+
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def tag_image(
+    text: str,
+    font_file: str,
+    font_size: int,
+    background: tuple[int, int, int] = TAG_BACKGROUND,
+    foreground: tuple[int, int, int] = TAG_FOREGROUND,
+) -> Image.Image:
+    """
+    Render a step tag once and reuse it for every frame with the same label.
+
+    Each call that misses the cache loads its own font, so tags can be rendered
+    from several threads at once.
+
+    Args:
+        text (str): The label shown in the tag.
+        font_file (str): The path of the font file.
+        font_size (int): The font size in points.
+        background (tuple[int, int, int]): The RGB color of the tag.
+        foreground (tuple[int, int, int]): The RGB color of the label.
+
+    Returns:
+        Image.Image: The RGBA tag, which must not be modified.
+    """
+
+    font = ImageFont.truetype(font_file, font_size)
+
+    # Every tag is sized for two digits so tags line up across frames
+    l, t, r, b = font.getbbox("00")
+    width = r - l + TAG_MARGIN * 2
+    height = b - t + TAG_MARGIN * 2
+
+    image = Image.new("RGBA", (width, height), background)
+    ImageDraw.Draw(image).text(
+        (width / 2, height / 2 + 2),
+        text,
+        font=font,
+        fill=foreground,
+        anchor="mm",
+    )
+
+    return image
+
+
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def tag_position(
+    image_size: tuple[int, int], corner: int, tag_size: tuple[int, int]
+) -> tuple[int, int] | None:
+    """
+    Find where a tag is pasted on a frame.
+
+    Args:
+        image_size (tuple[int, int]): The frame width and height.
+        corner (int): 1 for top-right, 2 for top-left, 3 for bottom-left and 4
+            for bottom-right.
+        tag_size (tuple[int, int]): The tag width and height.
+
+    Returns:
+        tuple[int, int] | None: The top-left corner of the tag, or None if the
+            frame is not tagged.
+    """
+
+    (image_width, image_height), (tag_width, tag_height) = image_size, tag_size
+    right = image_width - tag_width - TAG_MARGIN
+    bottom = image_height - tag_height - TAG_MARGIN
+
+    return {
+        1: (right, TAG_MARGIN),
+        2: (TAG_MARGIN, TAG_MARGIN),
+        3: (TAG_MARGIN, bottom),
+        4: (right, bottom),
+    }.get(corner)
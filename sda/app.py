@@ -1,39 +1,187 @@
 import logging
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Iterator
 
 # TensorFlow and Keras are very verbose by default...
 logging.basicConfig(level=logging.ERROR)
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
 from rich import print
-from typer import Argument, Option, confirm, Abort, Typer
+from typer import Argument, BadParameter, Option, confirm, Abort, Typer
 from typing_extensions import Annotated
 
 from .animators.base_animator import BaseAnimator
 from .animators.gif_animator import GIFAnimator
 from .animators.mp4_animator import MP4Animator
+from .animators.sources import SharedSources
+from .batch import BATCH_FILENAME, parse_batch, run_batch, schedule_batch
+from .daemon import SOCKET_PATH, DaemonError, ModelServer, is_running, submit
+from .jobs import run_generate, run_preview
+from .models.checkpoints import CHECKPOINT_EVERY
+from .models.pool import POOL_MEMORY, ModelPool
+from .models.results import RESULT_CACHE_MB
+from .models.samplers import SAMPLER, SAMPLERS, SPACING, SPACINGS
 from .models.helpers import (
     initialize_model,
-    generate_image,
     parse_prompt,
     parse_seeds,
     parse_steps,
 )
+from .utilities.manifest import prompt_hash, read_manifest
+from .utilities.profiling import profiling
+from .workqueue import QUEUE_DIR, run_coordinator, run_worker
 from .utilities.images import (
     WIDTH,
     HEIGHT,
     DIR_PREVIEWS,
     DIR_INTERNAL,
     DIR_EXTERNAL,
-    save_image,
+    DIR_CACHE,
+    FORMAT,
+    FORMATS,
+    PNG_COMPRESS_LEVEL,
+    ImageWriter,
     is_empty,
     empty_dir,
     list_dir,
+    ImageFile,
 )
 
+if TYPE_CHECKING:
+    from .models.stable_diffusion import StableDiffusionWriter
+
 app = Typer(no_args_is_help=True)
 
 
+def _initialize_model(
+    width: int,
+    height: int,
+    cache: bool,
+    fast_decode: bool,
+    decode_memory: int,
+    cache_size: int,
+) -> "StableDiffusionWriter":
+    return initialize_model(
+        width,
+        height,
+        fast_decode=fast_decode,
+        decode_memory=decode_memory or None,
+        result_cache_mb=cache_size,
+        **_cache_dirs(cache),
+    )
+
+
+def _check_sampler(sampler: str, spacing: str) -> None:
+    if sampler not in SAMPLERS:
+        raise BadParameter(
+            f"Sampler must be one of {', '.join(SAMPLERS)}.", param_hint="--sampler"
+        )
+
+    if spacing not in SPACINGS:
+        raise BadParameter(
+            f"Spacing must be one of {', '.join(SPACINGS)}.", param_hint="--spacing"
+        )
+
+
+def _submit(
+    command: str,
+    options: dict,
+    width: int,
+    height: int,
+    fast_decode: bool,
+    decode_memory: int,
+    cache: bool,
+    cache_size: int,
+    save: Callable,
+) -> int:
+    print(
+        ":robot: [bold blue]Daemon[/bold blue]:",
+        "Running this job on the warm model daemon",
+    )
+
+    try:
+        result = submit(
+            command,
+            {
+                **options,
+                "width": width,
+                "height": height,
+                "fast_decode": fast_decode,
+                "decode_memory": decode_memory,
+                "cache": cache,
+                "cache_size": cache_size,
+            },
+            save=save,
+            say=print,
+        )
+    except DaemonError as error:
+        print(":x: [bold red]Error[/bold red]:", str(error))
+        raise Abort()
+
+    return result["count"]
+
+
+def _check_format(image_format: str, compress_level: int) -> None:
+    if image_format not in FORMATS:
+        raise BadParameter(
+            f"Image format must be one of {', '.join(FORMATS)}.",
+            param_hint="--format",
+        )
+
+    if not 0 <= compress_level <= 9:
+        raise BadParameter(
+            "Compression level must be between 0 and 9.",
+            param_hint="--compress-level",
+        )
+
+
+def _image_writer(
+    image_format: str,
+    compress_level: int,
+    prompt: str | None = None,
+    sampler: str | None = None,
+) -> ImageWriter:
+    _check_format(image_format, compress_level)
+    return ImageWriter(image_format, compress_level, prompt=prompt, sampler=sampler)
+
+
+def _cache_dirs(cache: bool) -> dict:
+    # Absolute so workers and daemons started elsewhere share this project's cache
+    return {
+        "embedding_dir": (
+            os.path.abspath(os.path.join(DIR_CACHE, "embeddings")) if cache else None
+        ),
+        "result_dir": (
+            os.path.abspath(os.path.join(DIR_CACHE, "results")) if cache else None
+        ),
+    }
+
+
+@contextmanager
+def _profile(path: str | None) -> Iterator[None]:
+    with profiling(path) as profiler:
+        yield
+
+    if profiler is None:
+        return
+
+    for stage in profiler.aggregates():
+        print(
+            f":robot: [bold blue]Profile {stage['name']}[/bold blue]:",
+            f"{stage['count']} calls, {stage['total_ms'] / 1000:.2f}s total,",
+            f"{stage['mean_ms']:.1f}ms mean, {stage['max_ms']:.1f}ms max",
+        )
+
+    print(
+        ":robot: [bold blue]Profile[/bold blue]:",
+        f"Peak memory {profiler.peak_rss_mb:.0f} MB, trace saved to {path}",
+    )
+
+
 def _confirm_empty(directory: str, name: str) -> None:
     if is_empty(directory):
         return
@@ -50,33 +198,55 @@ def _confirm_empty(directory: str, name: str) -> None:
     empty_dir(directory)
 
 
-def _generate_animation(
-    animator: BaseAnimator,
+def _rendered(
+    directory: str, seed: int, size: tuple[int, int], prompt: str, sampler: str
+) -> list[int]:
+    # The manifest tells frames of this job apart from leftovers of another, and
+    # settings it doesn't know are taken as this job's, as without one
+    records = {record["path"]: record for record in read_manifest(directory) or []}
+
+    def matches(image: ImageFile) -> bool:
+        record = records.get(os.path.basename(image.path))
+        if record is None:
+            return True
+
+        return (
+            (record["width"], record["height"]) == size
+            and record["prompt"] in (None, prompt)
+            and record.get("sampler") in (None, sampler)
+        )
+
+    return [
+        image.step
+        for image in list_dir(directory)
+        if image.seed == seed and matches(image)
+    ]
+
+
+def _animation_jobs(
+    animators: dict[str, Callable[..., BaseAnimator]],
     directory: str,
     suffix: str,
-    tag: int,
-    loop: bool,
-    fps: int,
-    hold_time: float,
-    fade_time: float,
-):
-    if not is_empty(directory):
-        print(
-            ":robot: [bold blue]Animate[/bold blue]:",
-            f"Building {suffix} animation...",
-        )
+) -> list[tuple[BaseAnimator, list[ImageFile], str]]:
+    if is_empty(directory):
+        return []
 
-        images = list_dir(directory)
-        filepath = f"{images[-1][1]:010d}_{images[-1][2]:03d}_{suffix}"
-        animator.generate(
-            images,
-            filepath,
-            tag=tag,
-            loop=loop,
-            fps=fps,
-            hold_time=hold_time,
-            fade_time=fade_time,
-        )
+    print(
+        ":robot: [bold blue]Animate[/bold blue]:",
+        f"Building {suffix}",
+        " and ".join(animators),
+        "animation..." if len(animators) == 1 else "animations...",
+    )
+
+    images = list_dir(directory)
+    filepath = f"{images[-1][1]:010d}_{images[-1][2]:03d}_{suffix}"
+
+    # Every format tags the same source frames, so they are loaded only once
+    sources = SharedSources(len(animators)) if len(animators) > 1 else None
+
+    return [
+        (animator(sources=sources), images, filepath) for animator in animators.values()
+    ]
 
 
 @app.command()
@@ -103,38 +273,123 @@ def preview(
     steps: Annotated[str, Argument(help="generate steps")],
     width: Annotated[int, Option("--width", "-w", help="image width")] = WIDTH,
     height: Annotated[int, Option("--height", "-h", help="image height")] = HEIGHT,
+    batch: Annotated[int, Option("--batch", "-b", help="seeds per batch")] = 1,
+    sampler: Annotated[
+        str, Option("--sampler", help="sampler, ddim, dpmpp-2m or euler-a")
+    ] = SAMPLER,
+    spacing: Annotated[
+        str, Option("--spacing", help="timestep spacing, linspace, leading or trailing")
+    ] = SPACING,
+    cache: Annotated[
+        bool, Option("--cache/--no-cache", help="use the on-disk caches")
+    ] = True,
+    cache_size: Annotated[
+        int, Option("--cache-size", help="result cache size cap in MB")
+    ] = RESULT_CACHE_MB,
+    fast_decode: Annotated[
+        bool, Option("--fast-decode", help="approximate the image decoder")
+    ] = False,
+    decode_memory: Annotated[
+        int, Option("--decode-memory", help="decoder memory budget in MB")
+    ] = 0,
+    daemon: Annotated[
+        bool, Option("--daemon/--no-daemon", help="use the warm model daemon")
+    ] = True,
+    workers: Annotated[
+        int, Option("--workers", help="worker processes, 0 to run in this one")
+    ] = 0,
+    threads: Annotated[
+        int, Option("--threads", help="TensorFlow threads per worker, 0 to split")
+    ] = 0,
+    queue: Annotated[
+        str, Option("--queue", help="job queue directory shared with workers")
+    ] = QUEUE_DIR,
+    profile: Annotated[
+        str | None, Option("--profile", help="save a stage timing trace to a file")
+    ] = None,
+    image_format: Annotated[
+        str, Option("--format", help="image format, png or webp")
+    ] = FORMAT,
+    compress_level: Annotated[
+        int, Option("--compress-level", help="PNG compression level, 0-9")
+    ] = PNG_COMPRESS_LEVEL,
 ) -> None:
     """
     Generate preview images from the Stable Diffusion model.
     """
 
+    if batch < 1:
+        raise BadParameter("Batch size must be at least 1.", param_hint="--batch")
+
+    if workers < 0:
+        raise BadParameter("Workers cannot be negative.", param_hint="--workers")
+
+    if profile and (workers or queue != QUEUE_DIR):
+        raise BadParameter(
+            "Profiling runs in this process, so it can't use workers.",
+            param_hint="--profile",
+        )
+
+    _check_sampler(sampler, spacing)
+
     seeds = parse_seeds(seeds)
     steps = parse_steps(steps)
     include, exclude, adherence = parse_prompt()
-    model = initialize_model(width, height)
-
-    count = len(seeds) * len(steps)
-    current = 0
+    options = {
+        "seeds": seeds,
+        "steps": steps,
+        "include": include,
+        "exclude": exclude,
+        "adherence": adherence,
+        "batch": batch,
+        "sampler": sampler,
+        "spacing": spacing,
+    }
+
+    prompt = prompt_hash(include, exclude, adherence)
+    identifier = SAMPLERS[sampler].identifier(spacing)
+
+    if workers or queue != QUEUE_DIR:
+        _check_format(image_format, compress_level)
+        _preview_workers(
+            options,
+            workers,
+            threads,
+            queue,
+            cache,
+            {
+                "width": width,
+                "height": height,
+                "fast_decode": fast_decode,
+                "decode_memory": decode_memory,
+                "output_dir": os.path.abspath(DIR_PREVIEWS),
+                "image_format": image_format,
+                "compress_level": compress_level,
+                "prompt": prompt,
+            },
+        )
+        return
 
-    for seed in seeds:
-        for step in steps:
-            current += 1
-            print(
-                f":robot: [bold blue]Image {current} of {count}[/bold blue]:",
-                f"Generating {width} x {height} image for seed {seed} over {step} steps",
+    with _profile(profile), _image_writer(
+        image_format, compress_level, prompt, identifier
+    ) as writer:
+        if daemon and not profile and is_running():
+            count = _submit(
+                "preview",
+                options,
+                width,
+                height,
+                fast_decode,
+                decode_memory,
+                cache,
+                cache_size,
+                writer.save,
             )
-
-            generate_image(
-                model,
-                seed,
-                step,
-                include,
-                exclude,
-                adherence,
-                external_callback=lambda image, seed, step: save_image(
-                    image, seed, step, DIR_PREVIEWS
-                ),
+        else:
+            model = _initialize_model(
+                width, height, cache, fast_decode, decode_memory, cache_size
             )
+            count = run_preview(model, save=writer.save, say=print, **options)
 
     print(
         ":heavy_check_mark: [bold green]Success[/bold green]:",
@@ -142,6 +397,93 @@ def preview(
     )
 
 
+def _preview_workers(
+    options: dict, workers: int, threads: int, queue: str, cache: bool, job: dict
+) -> None:
+    # Each job is a single image, so --batch only applies in-process
+    jobs = [
+        {
+            **job,
+            "seed": seed,
+            "step": step,
+            **{
+                key: options[key]
+                for key in ("include", "exclude", "adherence", "sampler", "spacing")
+            },
+        }
+        for step in options["steps"]
+        for seed in options["seeds"]
+    ]
+
+    if workers:
+        threads = threads or max((os.cpu_count() or 1) // workers, 1)
+        print(
+            ":robot: [bold blue]Workers[/bold blue]:",
+            f"Rendering {len(jobs)} images on {workers} workers",
+            f"with {threads} threads each",
+        )
+    else:
+        print(
+            ":robot: [bold blue]Workers[/bold blue]:",
+            f"Queued {len(jobs)} images, waiting for `sda worker {queue}`",
+        )
+
+    try:
+        rendered, failed = run_coordinator(
+            jobs, workers, print, queue, threads, **_cache_dirs(cache)
+        )
+    except KeyboardInterrupt:
+        print(":x: [bold red]Error[/bold red]:", "Stopped the workers.")
+        raise Abort()
+
+    if failed:
+        print(
+            ":x: [bold red]Error[/bold red]:",
+            f"{failed} preview images failed, {rendered} saved.",
+        )
+        raise Abort()
+
+    print(
+        ":heavy_check_mark: [bold green]Success[/bold green]:",
+        f"{rendered} preview images saved!",
+    )
+
+
+@app.command()
+def worker(
+    queue: Annotated[
+        str, Argument(help="job queue directory shared with the coordinator")
+    ] = QUEUE_DIR,
+    threads: Annotated[
+        int, Option("--threads", help="TensorFlow threads, 0 for all cores")
+    ] = 0,
+    wait: Annotated[
+        bool, Option("--wait/--no-wait", help="keep waiting for new jobs")
+    ] = True,
+    cache: Annotated[
+        bool, Option("--cache/--no-cache", help="use the on-disk caches")
+    ] = True,
+) -> None:
+    """
+    Render preview images queued by `sda preview --workers` or `--queue`.
+    """
+
+    print(
+        ":robot: [bold blue]Worker[/bold blue]:",
+        f"Taking jobs from {queue}, press Ctrl+C to stop",
+    )
+
+    try:
+        count = run_worker(queue, threads, wait, say=print, **_cache_dirs(cache))
+    except KeyboardInterrupt:
+        count = None
+
+    print(
+        ":heavy_check_mark: [bold green]Success[/bold green]:",
+        "Worker stopped." if count is None else f"{count} preview images saved!",
+    )
+
+
 @app.command()
 def generate(
     seed: Annotated[int, Argument(help="single seed")],
@@ -149,55 +491,239 @@ def generate(
     width: Annotated[int, Option("--width", "-w", help="image width")] = WIDTH,
     height: Annotated[int, Option("--height", "-h", help="image height")] = HEIGHT,
     start: Annotated[int, Option("--start", "-s", help="start at step")] = 2,
+    sampler: Annotated[
+        str, Option("--sampler", help="sampler, ddim, dpmpp-2m or euler-a")
+    ] = SAMPLER,
+    spacing: Annotated[
+        str, Option("--spacing", help="timestep spacing, linspace, leading or trailing")
+    ] = SPACING,
+    cache: Annotated[
+        bool, Option("--cache/--no-cache", help="use the on-disk caches")
+    ] = True,
+    cache_size: Annotated[
+        int, Option("--cache-size", help="result cache size cap in MB")
+    ] = RESULT_CACHE_MB,
+    resume: Annotated[
+        bool, Option("--resume", help="continue from the last checkpoint")
+    ] = False,
+    checkpoint_every: Annotated[
+        int,
+        Option("--checkpoint-every", help="steps between checkpoints, 0 to disable"),
+    ] = CHECKPOINT_EVERY,
+    sweep: Annotated[
+        bool, Option("--sweep/--no-sweep", help="run all step counts at once")
+    ] = True,
+    sweep_batch: Annotated[
+        int, Option("--sweep-batch", help="step counts per UNet batch")
+    ] = 8,
+    decode_batch: Annotated[
+        int, Option("--decode-batch", help="internal frames decoded at once")
+    ] = 0,
+    decode_async: Annotated[
+        bool,
+        Option("--decode-async", help="decode internal frames in the background"),
+    ] = False,
+    fast_decode: Annotated[
+        bool, Option("--fast-decode", help="approximate the image decoder")
+    ] = False,
+    decode_memory: Annotated[
+        int, Option("--decode-memory", help="decoder memory budget in MB")
+    ] = 0,
+    daemon: Annotated[
+        bool, Option("--daemon/--no-daemon", help="use the warm model daemon")
+    ] = True,
+    profile: Annotated[
+        str | None, Option("--profile", help="save a stage timing trace to a file")
+    ] = None,
+    image_format: Annotated[
+        str, Option("--format", help="image format, png or webp")
+    ] = FORMAT,
+    compress_level: Annotated[
+        int, Option("--compress-level", help="PNG compression level, 0-9")
+    ] = PNG_COMPRESS_LEVEL,
 ) -> None:
     """
     Generate internal and external frames using the Stable Diffusion model.
     """
 
-    _confirm_empty(DIR_INTERNAL, "internal frames")
-    _confirm_empty(DIR_EXTERNAL, "external frames")
+    _check_sampler(sampler, spacing)
+    if checkpoint_every < 0:
+        raise BadParameter(
+            "Checkpoint interval cannot be negative.", param_hint="--checkpoint-every"
+        )
+
+    writer = _image_writer(image_format, compress_level)
+
+    # Resuming keeps the frames of the interrupted run
+    if not resume:
+        _confirm_empty(DIR_INTERNAL, "internal frames")
+        _confirm_empty(DIR_EXTERNAL, "external frames")
 
     include, exclude, adherence = parse_prompt()
-    model = initialize_model(width, height)
+    writer.prompt = prompt_hash(include, exclude, adherence)
+    writer.sampler = SAMPLERS[sampler].identifier(spacing)
+    size = (width, height)
+    options = {
+        "seed": seed,
+        "steps": steps,
+        "include": include,
+        "exclude": exclude,
+        "adherence": adherence,
+        "start": start,
+        "sweep": sweep,
+        "sweep_batch": sweep_batch,
+        "decode_batch": decode_batch,
+        "decode_async": decode_async,
+        "sampler": sampler,
+        "spacing": spacing,
+        # Absolute so a daemon started elsewhere writes into this project
+        "checkpoint_dir": (
+            os.path.abspath(os.path.join(DIR_CACHE, "checkpoints"))
+            if checkpoint_every
+            else None
+        ),
+        "checkpoint_every": checkpoint_every,
+        "resume": resume,
+        "rendered_external": (
+            _rendered(DIR_EXTERNAL, seed, size, writer.prompt, writer.sampler)
+            if resume
+            else []
+        ),
+        "rendered_internal": (
+            _rendered(DIR_INTERNAL, seed, size, writer.prompt, writer.sampler)
+            if resume
+            else []
+        ),
+    }
+
+    with _profile(profile), writer:
+        if daemon and not profile and is_running():
+            count = _submit(
+                "generate",
+                options,
+                width,
+                height,
+                fast_decode,
+                decode_memory,
+                cache,
+                cache_size,
+                writer.save,
+            )
+        else:
+            model = _initialize_model(
+                width, height, cache, fast_decode, decode_memory, cache_size
+            )
+            count = run_generate(model, save=writer.save, say=print, **options)
 
-    count = steps - start + 1
-    current = 0
+    print(
+        ":heavy_check_mark: [bold green]Success[/bold green]:",
+        f"{count} external frames and {steps} internal frames generated!",
+    )
 
-    for step in range(steps, start - 1, -1):
-        current += 1
-        print(
-            f":robot: [bold blue]Image {current} of {count}[/bold blue]:",
-            f"Generating {width} x {height} frame for seed {seed} over {step} steps",
-        )
 
-        if step == steps:
-            print(
-                ":robot: [bold blue]Image[/bold blue]:",
-                f"Saving {step} internal frames for this external frame",
-            )
+@app.command()
+def batch(
+    filename: Annotated[str, Argument(help="batch job file")] = BATCH_FILENAME,
+    cache: Annotated[
+        bool, Option("--cache/--no-cache", help="use the on-disk caches")
+    ] = True,
+    cache_size: Annotated[
+        int, Option("--cache-size", help="result cache size cap in MB")
+    ] = RESULT_CACHE_MB,
+    pool_memory: Annotated[
+        int, Option("--pool-memory", help="memory cap for warm models in MB")
+    ] = POOL_MEMORY,
+    profile: Annotated[
+        str | None, Option("--profile", help="save a stage timing trace to a file")
+    ] = None,
+    image_format: Annotated[
+        str, Option("--format", help="image format, png or webp")
+    ] = FORMAT,
+    compress_level: Annotated[
+        int, Option("--compress-level", help="PNG compression level, 0-9")
+    ] = PNG_COMPRESS_LEVEL,
+) -> None:
+    """
+    Run many preview and generate jobs from a file on warm models.
+    """
+
+    try:
+        jobs = schedule_batch(parse_batch(filename))
+    except (OSError, ValueError) as error:
+        raise BadParameter(str(error), param_hint="FILENAME")
+
+    pool = ModelPool(pool_memory, result_cache_mb=cache_size, **_cache_dirs(cache))
+    start = time.perf_counter()
 
-        generate_image(
-            model,
-            seed,
-            step,
-            include,
-            exclude,
-            adherence,
-            external_callback=lambda image, seed, step: (
-                save_image(image, seed, step, DIR_EXTERNAL)
-            ),
-            internal_callback=(
-                None
-                if step != steps
-                else lambda image, seed, step: (
-                    save_image(image, seed, step, DIR_INTERNAL)
-                )
-            ),
+    with _profile(profile), _image_writer(image_format, compress_level) as writer:
+        timings = run_batch(jobs, pool, writer, print)
+
+    for timing in timings:
+        if timing["count"] is None:
+            print(":x: [bold red]Failed[/bold red]:", timing["name"])
+            continue
+
+        message = f"{timing['count']} images in {timing['seconds']:.1f}s"
+        if timing["built"]:
+            message += ", including the model build"
+
+        print(f":robot: [bold blue]{timing['name']}[/bold blue]:", message)
+
+    failed = sum(timing["count"] is None for timing in timings)
+    summary = (
+        f"{len(timings) - failed} of {len(timings)} jobs finished in"
+        f" {time.perf_counter() - start:.1f}s with {pool.builds} model builds"
+    )
+
+    if failed:
+        print(":x: [bold red]Error[/bold red]:", summary)
+        raise Abort()
+
+    print(":heavy_check_mark: [bold green]Success[/bold green]:", summary + "!")
+
+
+@app.command()
+def serve(
+    socket: Annotated[str, Option("--socket", help="daemon socket path")] = SOCKET_PATH,
+    cache: Annotated[
+        bool, Option("--cache/--no-cache", help="use the on-disk caches")
+    ] = True,
+    cache_size: Annotated[
+        int, Option("--cache-size", help="result cache size cap in MB")
+    ] = RESULT_CACHE_MB,
+    pool_memory: Annotated[
+        int, Option("--pool-memory", help="memory cap for warm models in MB")
+    ] = POOL_MEMORY,
+) -> None:
+    """
+    Keep models warm and run preview and generate jobs from other commands.
+    """
+
+    try:
+        server = ModelServer(
+            socket,
+            pool_memory=pool_memory,
+            result_cache_mb=cache_size,
+            **_cache_dirs(cache),
         )
+    except DaemonError as error:
+        print(":x: [bold red]Error[/bold red]:", str(error))
+        raise Abort()
+
+    print(
+        ":robot: [bold blue]Daemon[/bold blue]:",
+        f"Serving warm models on {socket}, press Ctrl+C to stop",
+    )
+
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
     print(
         ":heavy_check_mark: [bold green]Success[/bold green]:",
-        f"{count} external frames and {steps} internal frames generated!",
+        "Daemon stopped.",
     )
 
 
@@ -220,56 +746,74 @@ def animate(
     external: Annotated[
         bool, Option("--external", help="generate external animation", is_flag=True)
     ] = False,
+    workers: Annotated[
+        int, Option("--workers", "-w", help="processes rendering frames, 0 for all")
+    ] = 1,
+    global_palette: Annotated[
+        bool,
+        Option(
+            "--global-palette/--frame-palette",
+            help="share one GIF palette between frames",
+        ),
+    ] = True,
+    dither: Annotated[
+        bool, Option("--dither", help="dither GIF frames", is_flag=True)
+    ] = False,
+    profile: Annotated[
+        str | None, Option("--profile", help="save a stage timing trace to a file")
+    ] = None,
 ):
     """
     Generate animations from the internal and external frames.
     """
 
-    if gif and mp4:
-        print(
-            ":x: [bold red]Error[/bold red]:",
-            "You cannot specify both --mp4 and --gif at the same time.",
-            True,
+    animators = {}
+    if gif:
+        animators["GIF"] = partial(
+            GIFAnimator, global_palette=global_palette, dither=dither
         )
-        raise Abort()
+    if mp4:
+        animators["MP4"] = MP4Animator
 
-    if mp4 and not gif:
-        animator = MP4Animator()
-    elif gif and not mp4:
-        animator = GIFAnimator()
-    else:
+    if not animators:
         print(
             ":x: [bold red]Error[/bold red]:",
-            "You must specify either --mp4 or --gif.",
+            "You must specify --mp4, --gif or both.",
         )
         raise Abort()
 
     if not internal and not external:
         internal = external = True
 
-    if internal:
-        _generate_animation(
-            animator=animator,
-            directory=DIR_INTERNAL,
-            suffix="INT",
-            tag=tag,
-            loop=loop,
-            fps=fps,
-            hold_time=hold_time,
-            fade_time=fade_time,
-        )
+    if workers < 1:
+        workers = os.cpu_count() or 1
 
+    jobs = []
+    if internal:
+        jobs += _animation_jobs(animators, DIR_INTERNAL, "INT")
     if external:
-        _generate_animation(
-            animator=animator,
-            directory=DIR_EXTERNAL,
-            suffix="EXT",
-            tag=tag,
-            loop=loop,
-            fps=fps,
-            hold_time=hold_time,
-            fade_time=fade_time,
-        )
+        jobs += _animation_jobs(animators, DIR_EXTERNAL, "EXT")
+
+    # Each output runs on its own thread and the rendering processes are split
+    # between them
+    with _profile(profile), ThreadPoolExecutor(max(len(jobs), 1)) as executor:
+        futures = [
+            executor.submit(
+                animator.generate,
+                images,
+                filepath,
+                tag=tag,
+                loop=loop,
+                fps=fps,
+                hold_time=hold_time,
+                fade_time=fade_time,
+                workers=max(workers // len(jobs), 1),
+            )
+            for animator, images, filepath in jobs
+        ]
+
+        for future in futures:
+            future.result()
 
     print(
         ":heavy_check_mark: [bold green]Success[/bold green]:",
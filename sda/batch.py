@@ -0,0 +1,237 @@
+import os
+import time
+from typing import TYPE_CHECKING
+
+import yaml
+
+from .jobs import SayCallback, run_generate, run_preview
+from .models.helpers import (
+    PROMPT_ADHERENCE,
+    PROMPT_EXCLUDES,
+    PROMPT_INCLUDES,
+    join_prompt,
+    parse_seeds,
+    parse_steps,
+)
+from .models.samplers import SAMPLER, SAMPLERS, SPACING, SPACINGS
+from .utilities.images import HEIGHT, WIDTH
+from .utilities.manifest import prompt_hash
+
+if TYPE_CHECKING:
+    from .models.pool import ModelPool
+    from .utilities.images import ImageWriter
+
+BATCH_FILENAME: str = "jobs.yml"
+BATCH_DIR: str = "batch"
+BATCH_KINDS: tuple[str, ...] = ("preview", "generate")
+
+
+def _values(value: any) -> str:
+    # Seeds and steps may be written as a number, a list or a parse_seeds string
+    if isinstance(value, list):
+        return ",".join(str(item) for item in value)
+
+    return str(value)
+
+
+def _parse_job(job: dict, index: int) -> dict:
+    name = str(job.get("name", f"job-{index:03d}"))
+    kind = job.get("kind", "preview")
+
+    if kind not in BATCH_KINDS:
+        raise ValueError(
+            f"Invalid batch format: job '{name}' has unknown kind '{kind}'."
+        )
+
+    include, exclude, adherence = join_prompt(
+        {
+            "includes": job.get("includes", PROMPT_INCLUDES),
+            "excludes": job.get("excludes", PROMPT_EXCLUDES),
+            "adherence": job.get("adherence", PROMPT_ADHERENCE),
+        }
+    )
+
+    sampler = job.get("sampler", SAMPLER)
+    spacing = job.get("spacing", SPACING)
+    if sampler not in SAMPLERS or spacing not in SPACINGS:
+        raise ValueError(
+            f"Invalid batch format: job '{name}' has an unknown sampler or spacing."
+        )
+
+    options = {
+        "include": include,
+        "exclude": exclude,
+        "adherence": adherence,
+        "sampler": sampler,
+        "spacing": spacing,
+    }
+
+    if kind == "preview":
+        options.update(
+            seeds=parse_seeds(_values(job.get("seeds", "R1"))),
+            steps=parse_steps(_values(job.get("steps", 16))),
+            batch=int(job.get("batch", 1)),
+        )
+        if options["batch"] < 1:
+            raise ValueError(
+                f"Invalid batch format: job '{name}' needs a batch of at least 1."
+            )
+    else:
+        if "seed" not in job or "steps" not in job:
+            raise ValueError(
+                f"Invalid batch format: job '{name}' needs a 'seed' and 'steps'."
+            )
+
+        options.update(
+            seed=int(job["seed"]),
+            steps=int(job["steps"]),
+            start=int(job.get("start", 2)),
+        )
+
+    return {
+        "name": name,
+        "kind": kind,
+        "width": int(job.get("width", WIDTH)),
+        "height": int(job.get("height", HEIGHT)),
+        "output": str(job.get("output", os.path.join(BATCH_DIR, name))),
+        "prompt": prompt_hash(include, exclude, adherence),
+        "sampler": SAMPLERS[sampler].identifier(spacing),
+        "options": options,
+    }
+
+
+def parse_batch(filename: str = BATCH_FILENAME) -> list[dict]:
+    """
+    Parse the jobs of a batch from a YAML file.
+
+    The file holds a `jobs` list and optional `defaults` merged into every job.
+    Each job has a `name`, a `kind` of preview or generate, the prompt
+    `includes`, `excludes` and `adherence`, a `width` and `height`, the `seeds`
+    and `steps` of a preview or the `seed`, `steps` and `start` of a generate
+    job, and the `output` directory its images are saved under.
+
+    Args:
+        filename (str): The path to the YAML file containing the jobs.
+
+    Returns:
+        list[dict]: The jobs in file order, with random seeds already picked.
+
+    Raises:
+        ValueError: If the YAML file contains invalid data.
+    """
+
+    with open(filename, "r") as file:
+        batch = yaml.safe_load(file) or {}
+
+    if isinstance(batch, list):
+        batch = {"jobs": batch}
+
+    jobs = batch.get("jobs")
+    defaults = batch.get("defaults") or {}
+    if not isinstance(jobs, list) or not jobs:
+        raise ValueError("Invalid batch format: 'jobs' must be a non-empty list.")
+    if not isinstance(defaults, dict):
+        raise ValueError("Invalid batch format: 'defaults' must be a mapping.")
+
+    parsed = []
+    for index, job in enumerate(jobs, 1):
+        if not isinstance(job, dict):
+            raise ValueError(f"Invalid batch format: job {index} must be a mapping.")
+
+        parsed.append(_parse_job({**defaults, **job}, index))
+
+    outputs = [job["output"] for job in parsed]
+    if len(set(outputs)) < len(outputs):
+        raise ValueError("Invalid batch format: every job needs its own output.")
+
+    return parsed
+
+
+def schedule_batch(jobs: list[dict]) -> list[dict]:
+    """
+    Order jobs so each model size is built once and each prompt encoded once.
+
+    Jobs are grouped on their size, since switching sizes may build a model,
+    and then on their prompt, so its text embedding is still cached when the
+    next job with it runs. Groups keep the order they first appear in.
+
+    Args:
+        jobs (list[dict]): The jobs returned by `parse_batch`.
+
+    Returns:
+        list[dict]: The jobs in the order they should run.
+    """
+
+    order = {}
+    for job in jobs:
+        order.setdefault((job["width"], job["height"]), len(order))
+        order.setdefault(job["prompt"], len(order))
+
+    return sorted(
+        jobs,
+        key=lambda job: (order[(job["width"], job["height"])], order[job["prompt"]]),
+    )
+
+
+def run_batch(
+    jobs: list[dict], pool: "ModelPool", writer: "ImageWriter", say: SayCallback
+) -> list[dict]:
+    """
+    Run jobs back to back on the warm models of a pool.
+
+    A failed job is reported and skipped, so one bad job doesn't stop the rest.
+
+    Args:
+        jobs (list[dict]): The jobs in the order they should run.
+        pool (ModelPool): The pool the models of every size are kept in.
+        writer (ImageWriter): Saves the images of every job.
+        say (SayCallback): Called with progress messages.
+
+    Returns:
+        list[dict]: The name, image count, seconds and whether a model was built
+            for each job, with a None count for failed jobs.
+    """
+
+    timings = []
+
+    for number, job in enumerate(jobs, 1):
+        say(
+            f":robot: [bold blue]Job {number} of {len(jobs)}[/bold blue]:",
+            f"{job['name']}, {job['kind']} at {job['width']} x {job['height']}",
+        )
+
+        start = time.perf_counter()
+        builds = pool.builds
+        output = job["output"]
+
+        def save(image: any, seed: int, step: int, directory: str) -> None:
+            writer.save(image, seed, step, os.path.join(output, directory))
+
+        run = run_preview if job["kind"] == "preview" else run_generate
+        writer.prompt = job["prompt"]
+        writer.sampler = job["sampler"]
+
+        try:
+            model = pool.get(job["width"], job["height"])
+            count = run(model, save=save, say=say, **job["options"])
+            writer.flush()
+        except Exception as error:
+            count = None
+            say(
+                ":x: [bold red]Error[/bold red]:",
+                f"Job {job['name']} failed: {type(error).__name__}: {error}",
+            )
+        else:
+            # Components are built lazily, so the pool is only measured after a job
+            pool.evict(keep=(model.img_width, model.img_height))
+
+        timings.append(
+            {
+                "name": job["name"],
+                "count": count,
+                "seconds": time.perf_counter() - start,
+                "built": pool.builds > builds,
+            }
+        )
+
+    return timings
@@ -0,0 +1,254 @@
+import base64
+import json
+import os
+import socket
+import socketserver
+import threading
+from typing import Callable
+
+from PIL import Image
+
+SOCKET_PATH: str = os.environ.get(
+    "SDA_SOCKET",
+    os.path.join(os.path.expanduser("~"), ".cache", "sda", "daemon.sock"),
+)
+
+# save(image, seed, step, directory) and say(*message_parts)
+SaveCallback = Callable[[Image.Image, int, int, str], None]
+SayCallback = Callable[..., None]
+
+
+class DaemonError(RuntimeError):
+    """
+    Raised on the client when a job fails inside the daemon.
+    """
+
+
+def _encode_image(image: Image.Image) -> dict:
+    # Raw pixels are cheaper to produce than a PNG and the client encodes anyway
+    return {
+        "mode": image.mode,
+        "size": list(image.size),
+        "data": base64.b64encode(image.tobytes()).decode("ascii"),
+    }
+
+
+def _decode_image(payload: dict) -> Image.Image:
+    return Image.frombytes(
+        payload["mode"], tuple(payload["size"]), base64.b64decode(payload["data"])
+    )
+
+
+def is_running(path: str = SOCKET_PATH) -> bool:
+    """
+    Check whether a daemon is accepting connections on the socket.
+
+    Args:
+        path (str): The path of the daemon's Unix socket.
+
+    Returns:
+        bool: True if a daemon is listening, False otherwise.
+    """
+
+    if not os.path.exists(path):
+        return False
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(path)
+        except OSError:
+            return False
+
+    return True
+
+
+def submit(
+    command: str,
+    options: dict,
+    save: SaveCallback,
+    say: SayCallback,
+    path: str = SOCKET_PATH,
+) -> dict:
+    """
+    Run a job on the daemon, streaming its messages and images back.
+
+    Args:
+        command (str): The job to run, either "preview" or "generate".
+        options (dict): The job's arguments.
+        save (SaveCallback): Called with each image and its output directory.
+        say (SayCallback): Called with each progress message.
+        path (str): The path of the daemon's Unix socket.
+
+    Returns:
+        dict: The job's result.
+
+    Raises:
+        DaemonError: If the job fails or the daemon closes the connection.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        stream = client.makefile("rwb")
+        stream.write(json.dumps({"command": command, "options": options}).encode())
+        stream.write(b"\n")
+        stream.flush()
+
+        for line in stream:
+            message = json.loads(line)
+
+            if message["type"] == "say":
+                say(*message["parts"])
+            elif message["type"] == "image":
+                save(
+                    _decode_image(message["image"]),
+                    message["seed"],
+                    message["step"],
+                    message["directory"],
+                )
+            elif message["type"] == "done":
+                return message["result"]
+            elif message["type"] == "error":
+                raise DaemonError(message["message"])
+
+    raise DaemonError("The daemon closed the connection before the job finished.")
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+
+    def _send(self, message: dict) -> None:
+        # Images can be sent from a background decoding thread
+        with self._write_lock:
+            self.wfile.write(json.dumps(message).encode() + b"\n")
+            self.wfile.flush()
+
+    def handle(self) -> None:
+        self._write_lock = threading.Lock()
+        line = self.rfile.readline()
+
+        # is_running connects without sending a job
+        if not line.strip():
+            return
+
+        request = json.loads(line)
+
+        def save(image: Image.Image, seed: int, step: int, directory: str) -> None:
+            self._send(
+                {
+                    "type": "image",
+                    "image": _encode_image(image),
+                    "seed": seed,
+                    "step": step,
+                    "directory": directory,
+                }
+            )
+
+        def say(*parts: str) -> None:
+            self._send({"type": "say", "parts": [str(part) for part in parts]})
+
+        try:
+            with self.server.lock:
+                result = self.server.run(
+                    request["command"], request["options"], save, say
+                )
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        except Exception as error:
+            self._send({"type": "error", "message": f"{type(error).__name__}: {error}"})
+            return
+
+        self._send({"type": "done", "result": result})
+
+
+class ModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Keeps a pool of warm models between jobs and runs one job at a time.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        path: str = SOCKET_PATH,
+        embedding_dir: str | None = None,
+        pool_memory: int | None = None,
+        result_dir: str | None = None,
+        result_cache_mb: int | None = None,
+    ):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        if os.path.exists(path):
+            if is_running(path):
+                raise DaemonError(f"A daemon is already running on {path}.")
+            os.remove(path)
+
+        super().__init__(path, _JobHandler)
+        self.path = path
+        self.embedding_dir = embedding_dir
+        self.pool_memory = pool_memory
+        self.result_dir = result_dir
+        self.result_cache_mb = result_cache_mb
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def model(self, width: int, height: int) -> any:
+        """
+        Return the warm model for an image size from the model pool.
+        """
+
+        from .models.pool import POOL_MEMORY, ModelPool
+        from .models.results import RESULT_CACHE_MB
+
+        if self.pool is None:
+            self.pool = ModelPool(
+                self.pool_memory or POOL_MEMORY,
+                embedding_dir=self.embedding_dir,
+                result_dir=self.result_dir,
+                result_cache_mb=self.result_cache_mb or RESULT_CACHE_MB,
+            )
+
+        return self.pool.get(width, height)
+
+    def run(
+        self, command: str, options: dict, save: SaveCallback, say: SayCallback
+    ) -> dict:
+        from .jobs import run_generate, run_preview
+        from .models.embeddings import EmbeddingCache
+
+        options = dict(options)
+        model = self.model(options.pop("width"), options.pop("height"))
+        model.fast_decode = options.pop("fast_decode", False)
+        model.decode_memory = options.pop("decode_memory", None) or None
+        cache = options.pop("cache", True)
+        cache_size = options.pop("cache_size", None)
+
+        if command not in ("preview", "generate"):
+            raise ValueError(f"Unknown daemon command: {command}")
+
+        caches = model.embedding_cache, model.result_cache
+        if not cache:
+            # Like an uncached run, embeddings are only kept for this job
+            model.embedding_cache = EmbeddingCache(model.text_encoder_id)
+            model.result_cache = None
+        elif self.result_dir is None:
+            say(
+                ":warning: [bold red]Warning[/bold red]:",
+                "The daemon was started with --no-cache, so nothing is cached on disk.",
+            )
+        elif cache_size:
+            # Every job sets the cap, so it holds until the next job
+            model.result_cache.max_bytes = cache_size * 2**20
+
+        try:
+            run = run_preview if command == "preview" else run_generate
+            result = {"count": run(model, save=save, say=say, **options)}
+        finally:
+            model.embedding_cache, model.result_cache = caches
+
+        # Components are built lazily, so the pool is only measured after a job
+        self.pool.evict(keep=(model.img_width, model.img_height))
+
+        return result
+
+    def server_close(self) -> None:
+        super().server_close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,391 @@
+from typing import TYPE_CHECKING, Callable
+
+from .models.checkpoints import CHECKPOINT_EVERY, CheckpointStore
+from .models.helpers import generate_image, generate_sweep
+from .models.samplers import SAMPLER, SAMPLERS, SPACING
+from .utilities.images import DIR_PREVIEWS, DIR_INTERNAL, DIR_EXTERNAL
+
+if TYPE_CHECKING:
+    from .models.stable_diffusion import StableDiffusionWriter
+
+# save(image, seed, step, directory) and say(*message_parts)
+SaveCallback = Callable[[any, int, int, str], None]
+SayCallback = Callable[..., None]
+
+
+def _cache_stats(model: "StableDiffusionWriter") -> tuple[int, int, int, int]:
+    stats = ()
+    for cache in (model.embedding_cache, model.result_cache):
+        stats += (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+    return stats
+
+
+def _say_cache_stats(
+    model: "StableDiffusionWriter",
+    before: tuple[int, int, int, int],
+    say: SayCallback,
+) -> None:
+    hits, misses, result_hits, _ = _cache_stats(model)
+
+    say(
+        ":robot: [bold blue]Cache[/bold blue]:",
+        f"{hits - before[0]} text embeddings reused, {misses - before[1]} encoded",
+    )
+
+    if model.result_cache is not None:
+        say(
+            ":robot: [bold blue]Cache[/bold blue]:",
+            f"{result_hits - before[2]} images reused from the result cache",
+        )
+
+
+def _result_settings(
+    model: "StableDiffusionWriter",
+    include: str,
+    exclude: str,
+    adherence: float,
+    sampler: str,
+    spacing: str,
+) -> dict:
+    # Everything besides the seed and step count that changes the pixels
+    return {
+        "include": include,
+        "exclude": exclude,
+        "adherence": adherence,
+        "width": model.img_width,
+        "height": model.img_height,
+        "sampler": SAMPLERS[sampler].identifier(spacing),
+        "decoder": "fast" if model.fast_decode else model.decode_memory or "full",
+    }
+
+
+def _cached_result(
+    model: "StableDiffusionWriter",
+    settings: dict,
+    seed: int,
+    steps: int,
+    frame: int | None = None,
+) -> any:
+    cache = model.result_cache
+    if cache is None:
+        return None
+
+    return cache.get(
+        cache.key({**settings, "seed": seed, "steps": steps, "frame": frame})
+    )
+
+
+def _store_result(
+    model: "StableDiffusionWriter",
+    settings: dict,
+    save: SaveCallback,
+    directory: str,
+    steps: int | None = None,
+) -> Callable[[any, int, int], None]:
+    # Internal frames are keyed on their frame within the `steps` step schedule
+    def callback(image: any, seed: int, step: int) -> None:
+        cache = model.result_cache
+        if cache is not None:
+            key = {**settings, "seed": seed, "steps": steps, "frame": step}
+            if steps is None:
+                key.update(steps=step, frame=None)
+            cache.put(cache.key(key), image)
+
+        save(image, seed, step, directory)
+
+    return callback
+
+
+def run_preview(
+    model: "StableDiffusionWriter",
+    seeds: list[int],
+    steps: list[int],
+    include: str,
+    exclude: str,
+    adherence: float,
+    save: SaveCallback,
+    say: SayCallback,
+    batch: int = 1,
+    sampler: str = SAMPLER,
+    spacing: str = SPACING,
+) -> int:
+    """
+    Generate preview images for every seed and step combination.
+
+    Args:
+        model (StableDiffusionWriter): The model used to generate the images.
+        seeds (list[int]): The seeds to generate images for.
+        steps (list[int]): The step counts to generate images for.
+        include (str): The positive prompt.
+        exclude (str): The negative prompt.
+        adherence (float): The guidance scale.
+        save (SaveCallback): Called with each image and its output directory.
+        say (SayCallback): Called with progress messages.
+        batch (int): The number of seeds generated in a single diffusion run.
+        sampler (str): The sampler used to generate the images.
+        spacing (str): The timestep spacing of the sampler.
+
+    Returns:
+        int: The number of images saved, including ones reused from the cache.
+    """
+
+    cache_stats = _cache_stats(model)
+    settings = _result_settings(model, include, exclude, adherence, sampler, spacing)
+    count = len(seeds) * len(steps)
+    current = 0
+
+    for step in steps:
+        missing = []
+        for seed in seeds:
+            image = _cached_result(model, settings, seed, step)
+            if image is None:
+                missing.append(seed)
+            else:
+                save(image, seed, step, DIR_PREVIEWS)
+
+        if len(missing) < len(seeds):
+            current += len(seeds) - len(missing)
+            say(
+                ":robot: [bold blue]Cache[/bold blue]:",
+                f"Reusing {len(seeds) - len(missing)} cached images",
+                f"over {step} steps",
+            )
+
+        for index in range(0, len(missing), batch):
+            seed_batch = missing[index : index + batch]
+            label = (
+                f"Image {current + 1}"
+                if len(seed_batch) == 1
+                else f"Images {current + 1}-{current + len(seed_batch)}"
+            )
+            current += len(seed_batch)
+            say(
+                f":robot: [bold blue]{label} of {count}[/bold blue]:",
+                f"Generating {model.img_width} x {model.img_height} image for",
+                f"seed{'s' if len(seed_batch) > 1 else ''}",
+                ", ".join(str(seed) for seed in seed_batch),
+                f"over {step} steps",
+            )
+
+            generate_image(
+                model,
+                seed_batch if batch > 1 else seed_batch[0],
+                step,
+                include,
+                exclude,
+                adherence,
+                external_callback=_store_result(model, settings, save, DIR_PREVIEWS),
+                sampler=sampler,
+                spacing=spacing,
+            )
+
+    _say_cache_stats(model, cache_stats, say)
+
+    return count
+
+
+def run_generate(
+    model: "StableDiffusionWriter",
+    seed: int,
+    steps: int,
+    include: str,
+    exclude: str,
+    adherence: float,
+    save: SaveCallback,
+    say: SayCallback,
+    start: int = 2,
+    sweep: bool = True,
+    sweep_batch: int = 8,
+    decode_batch: int = 0,
+    decode_async: bool = False,
+    sampler: str = SAMPLER,
+    spacing: str = SPACING,
+    checkpoint_dir: str | None = None,
+    checkpoint_every: int = CHECKPOINT_EVERY,
+    resume: bool = False,
+    rendered_external: list[int] = (),
+    rendered_internal: list[int] = (),
+) -> int:
+    """
+    Generate the external frames from `start` to `steps` steps and the internal
+    frames of the `steps` step frame.
+
+    Args:
+        model (StableDiffusionWriter): The model used to generate the frames.
+        seed (int): The seed to generate frames for.
+        steps (int): The highest step count, which also sets the internal frame count.
+        include (str): The positive prompt.
+        exclude (str): The negative prompt.
+        adherence (float): The guidance scale.
+        save (SaveCallback): Called with each frame and its output directory.
+        say (SayCallback): Called with progress messages.
+        start (int): The lowest step count.
+        sweep (bool): Generate every step count in a single diffusion sweep.
+        sweep_batch (int): The number of step counts passed through the UNet at once.
+        decode_batch (int): The number of internal frames decoded at once.
+        decode_async (bool): Decode internal frames on a background thread.
+        sampler (str): The sampler used to generate the frames.
+        spacing (str): The timestep spacing of the sampler.
+        checkpoint_dir (str, optional): The directory checkpoints are written to.
+        checkpoint_every (int): The number of steps between checkpoints.
+        resume (bool): Continue from the job's checkpoints instead of clearing them.
+        rendered_external (list[int]): The step counts of the external frames
+            saved by an interrupted run, which are not generated again.
+        rendered_internal (list[int]): The internal frames saved by an
+            interrupted run.
+
+    Returns:
+        int: The number of external frames saved, including ones reused from the cache.
+    """
+
+    cache_stats = _cache_stats(model)
+    settings = _result_settings(model, include, exclude, adherence, sampler, spacing)
+    width, height = model.img_width, model.img_height
+    count = steps - start + 1
+
+    # Frames saved by an interrupted run of the same job are kept as they are
+    rendered_internal = set(rendered_internal)
+    internal_rendered = rendered_internal.issuperset(range(1, steps + 1))
+    pending = [
+        step for step in range(steps, start - 1, -1) if step not in rendered_external
+    ]
+
+    if resume:
+        say(
+            ":robot: [bold blue]Resume[/bold blue]:",
+            f"Keeping {count - len(pending)} external frames",
+            f"and {steps if internal_rendered else 0} internal frames already saved",
+        )
+
+    # The internal frames are only reused when every one of them is cached
+    internal = []
+    for frame in range(1, 0 if internal_rendered else steps + 1):
+        image = _cached_result(model, settings, seed, steps, frame)
+        if image is None:
+            break
+        internal.append(image)
+
+    internal_missing = not internal_rendered and len(internal) < steps
+
+    external = {step: _cached_result(model, settings, seed, step) for step in pending}
+    missing = [step for step, image in external.items() if image is None]
+    if internal_missing and steps not in missing:
+        missing.insert(0, steps)
+
+    reused = [step for step in external if step not in missing]
+    if reused or len(internal) == steps:
+        say(
+            ":robot: [bold blue]Cache[/bold blue]:",
+            f"Reusing {len(reused)} cached external frames",
+            f"and {len(internal) if len(internal) == steps else 0} internal frames",
+        )
+
+    for step in reused:
+        save(external[step], seed, step, DIR_EXTERNAL)
+    if len(internal) == steps:
+        for frame, image in enumerate(internal, start=1):
+            save(image, seed, frame, DIR_INTERNAL)
+    del internal, external
+
+    store = (
+        CheckpointStore(checkpoint_dir, {**settings, "seed": seed})
+        if checkpoint_dir is not None
+        else None
+    )
+    checkpoints = {}
+    if store is not None and resume:
+        checkpoints = store.load()
+    elif store is not None:
+        store.clear()
+
+    resumed = {step: checkpoints[step] for step in missing if step in checkpoints}
+
+    # The longest schedule also needs the internal frames before its checkpoint
+    if (
+        steps in resumed
+        and internal_missing
+        and not rendered_internal.issuperset(range(1, resumed[steps].iteration + 1))
+    ):
+        del resumed[steps]
+
+    if resumed:
+        say(
+            ":robot: [bold blue]Resume[/bold blue]:",
+            f"Continuing {len(resumed)} step counts from their checkpoints",
+        )
+
+    internal_callback = (
+        _store_result(model, settings, save, DIR_INTERNAL, steps=steps)
+        if internal_missing
+        else None
+    )
+
+    if sweep and missing:
+        say(
+            ":robot: [bold blue]Sweep[/bold blue]:",
+            f"Generating {len(missing)} {width} x {height} frames for seed {seed}",
+            f"over {missing[-1]} to {missing[0]} steps in a single sweep",
+        )
+        if internal_callback is not None:
+            say(
+                ":robot: [bold blue]Image[/bold blue]:",
+                f"Saving {steps} internal frames for the {steps} step frame",
+            )
+
+        generate_sweep(
+            model,
+            seed,
+            missing,
+            include,
+            exclude,
+            adherence,
+            external_callback=_store_result(model, settings, save, DIR_EXTERNAL),
+            internal_callback=internal_callback,
+            max_batch_size=sweep_batch,
+            decode_batch_size=decode_batch,
+            decode_in_background=decode_async,
+            sampler=sampler,
+            spacing=spacing,
+            resume=resumed,
+            checkpoint_callback=store.save if store is not None else None,
+            checkpoint_every=checkpoint_every,
+        )
+
+    elif missing:
+        for current, step in enumerate(missing, start=1):
+            say(
+                f":robot: [bold blue]Image {current} of {len(missing)}[/bold blue]:",
+                f"Generating {width} x {height} frame for seed {seed} over {step} steps",
+            )
+
+            if step == steps and internal_callback is not None:
+                say(
+                    ":robot: [bold blue]Image[/bold blue]:",
+                    f"Saving {step} internal frames for this external frame",
+                )
+
+            generate_image(
+                model,
+                seed,
+                step,
+                include,
+                exclude,
+                adherence,
+                external_callback=_store_result(model, settings, save, DIR_EXTERNAL),
+                internal_callback=internal_callback if step == steps else None,
+                decode_batch_size=decode_batch,
+                decode_in_background=decode_async,
+                sampler=sampler,
+                spacing=spacing,
+                resume=resumed.get(step),
+                checkpoint_callback=store.save if store is not None else None,
+                checkpoint_every=checkpoint_every,
+            )
+
+    if store is not None:
+        store.clear()
+
+    _say_cache_stats(model, cache_stats, say)
+
+    return count
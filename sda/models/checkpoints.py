@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import NamedTuple
+
+import numpy as np
+
+CHECKPOINT_EVERY: int = 4
+
+
+class Checkpoint(NamedTuple):
+    """
+    The progress of one schedule after `iteration` of its `steps` steps.
+    """
+
+    steps: int
+    iteration: int
+    latent: np.ndarray
+    state: dict
+
+
+class CheckpointStore:
+    """
+    Keeps the latest checkpoint of every schedule in a generate job on disk.
+
+    Each job gets its own folder, named after a hash of its settings, with one
+    `.npz` file per step count. Files are replaced atomically, so a crash while
+    writing leaves the previous checkpoint in place.
+    """
+
+    def __init__(self, directory: str, settings: dict) -> None:
+        job = json.dumps(settings, sort_keys=True)
+        self.directory = os.path.join(
+            directory, hashlib.sha256(job.encode()).hexdigest()[:16]
+        )
+
+    def _path(self, steps: int) -> str:
+        return os.path.join(self.directory, f"{steps:03d}.npz")
+
+    def save(self, checkpoints: list[Checkpoint]) -> None:
+        """
+        Write the checkpoints, replacing earlier ones for the same step counts.
+
+        Args:
+            checkpoints (list[Checkpoint]): The checkpoints of the running schedules.
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        for checkpoint in checkpoints:
+            # Arrays are stored as they are and everything else as JSON
+            arrays = {"latent": np.asarray(checkpoint.latent)}
+            state = {}
+            for key, value in checkpoint.state.items():
+                if isinstance(value, np.ndarray):
+                    arrays[f"state.{key}"] = value
+                else:
+                    state[key] = value
+
+            meta = {
+                "steps": checkpoint.steps,
+                "iteration": checkpoint.iteration,
+                "state": state,
+            }
+
+            path = self._path(checkpoint.steps)
+            temp_path = path + f".{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                np.savez(file, meta=np.array(json.dumps(meta)), **arrays)
+            os.replace(temp_path, path)
+
+    def load(self) -> dict[int, Checkpoint]:
+        """
+        Read the checkpoints of the job.
+
+        Returns:
+            dict[int, Checkpoint]: The latest checkpoint for each step count.
+        """
+
+        if not os.path.isdir(self.directory):
+            return {}
+
+        checkpoints = {}
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".npz"):
+                continue
+
+            with np.load(os.path.join(self.directory, name)) as file:
+                meta = json.loads(str(file["meta"]))
+                state = meta["state"]
+                for key in file.files:
+                    if key.startswith("state."):
+                        state[key.removeprefix("state.")] = file[key]
+
+                checkpoints[meta["steps"]] = Checkpoint(
+                    meta["steps"], meta["iteration"], file["latent"], state
+                )
+
+        return checkpoints
+
+    def clear(self) -> None:
+        """
+        Delete the job's checkpoints once it has finished.
+        """
+
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,221 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+import numpy as np
+from keras_cv.src.backend import ops
+
+# Linear projection from the 4 latent channels to RGB in [-1, 1]
+LATENT_RGB_FACTORS: np.ndarray = np.array(
+    [
+        [0.3512, 0.2297, 0.3227],
+        [0.3250, 0.4974, 0.2350],
+        [-0.2829, 0.1762, 0.2721],
+        [-0.2120, -0.2616, -0.7177],
+    ],
+    dtype="float32",
+)
+LATENT_SCALE: int = 8
+
+# Rough peak decoder memory per output pixel, used to size decoding tiles
+DECODER_BYTES_PER_PIXEL: int = 4096
+TILE_MULTIPLE: int = 8
+TILE_MINIMUM: int = 32
+TILE_OVERLAP: int = 8
+
+
+def approximate_decode(latent: any) -> np.ndarray:
+    """
+    Approximate the VAE decoder with a linear projection and a nearest-neighbor upsample.
+
+    Args:
+        latent (any): A batch of latents shaped (batch, height / 8, width / 8, 4).
+
+    Returns:
+        np.ndarray: A batch of uint8 RGB images shaped (batch, height, width, 3).
+    """
+
+    rgb = np.asarray(latent, dtype="float32") @ LATENT_RGB_FACTORS
+    rgb = np.clip((rgb + 1) * 127.5, 0, 255).astype("uint8")
+    return rgb.repeat(LATENT_SCALE, axis=1).repeat(LATENT_SCALE, axis=2)
+
+
+class DeferredDecoder:
+    """
+    Collects per-step latents and decodes them in batches.
+
+    With a batch size of 0 every latent is decoded as soon as it is added, which
+    matches decoding inside the denoising loop. Otherwise latents are buffered and
+    decoded `batch_size` at a time, optionally on a background thread so decoding
+    overlaps with the next denoising steps. Callbacks always run in step order,
+    and leaving the context decodes the remaining latents, even after an error.
+    """
+
+    def __init__(
+        self,
+        decode: Callable[[any], list],
+        callback: Callable[[any, int, int], None],
+        batch_size: int = 0,
+        background: bool = False,
+    ) -> None:
+        self._decode = decode
+        self._callback = callback
+        self._batch_size = batch_size
+        self._pending: list[tuple[any, int, int]] = []
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+        self._futures: list[Future] = []
+
+    def __enter__(self) -> "DeferredDecoder":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        try:
+            self.close()
+        except Exception:
+            # Don't hide the error that is already leaving the context
+            if exc_type is None:
+                raise
+
+    def add(self, latent: any, seed: int, iteration: int) -> None:
+        """
+        Queue a latent for decoding.
+
+        Args:
+            latent (any): The latent for a single image, shaped (1, h, w, 4).
+            seed (int): The seed passed to the callback with the decoded image.
+            iteration (int): The step passed to the callback with the decoded image.
+        """
+
+        self._pending.append((latent, seed, iteration))
+
+        if len(self._pending) >= max(self._batch_size, 1):
+            self._submit()
+
+    def flush(self) -> None:
+        """
+        Decode every queued latent and wait until their callbacks have run.
+
+        Raises:
+            Exception: Any error raised while decoding or in the callback.
+        """
+
+        if self._pending:
+            self._submit()
+
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        """
+        Decode any remaining latents and wait for background work to finish.
+
+        Raises:
+            Exception: Any error raised while decoding or in the callback.
+        """
+
+        try:
+            self.flush()
+        finally:
+            self._futures = []
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+
+    def _submit(self) -> None:
+        pending, self._pending = self._pending, []
+
+        if self._executor is None:
+            self._run(pending)
+        else:
+            # Surface errors from earlier batches instead of queuing more work
+            done = [future for future in self._futures if future.done()]
+            for future in done:
+                future.result()
+
+            self._futures = [future for future in self._futures if future not in done]
+            self._futures.append(self._executor.submit(self._run, pending))
+
+    def _run(self, pending: list[tuple[any, int, int]]) -> None:
+        latents = ops.concatenate([latent for latent, _, _ in pending], axis=0)
+
+        for image, (_, seed, iteration) in zip(self._decode(latents), pending):
+            self._callback(image, seed, iteration)
+
+
+def tile_size_for_budget(memory_mb: int) -> int:
+    """
+    Pick the largest square latent tile whose decoding fits in a memory budget.
+
+    Args:
+        memory_mb (int): The memory budget for a single decoder pass, in megabytes.
+
+    Returns:
+        int: The tile size in latent pixels, a multiple of TILE_MULTIPLE.
+    """
+
+    pixels = memory_mb * 2**20 / DECODER_BYTES_PER_PIXEL
+    size = int(np.sqrt(pixels)) // LATENT_SCALE
+    return max(TILE_MINIMUM, size // TILE_MULTIPLE * TILE_MULTIPLE)
+
+
+def _tile_starts(size: int, tile: int, overlap: int) -> list[int]:
+    if size <= tile:
+        return [0]
+
+    starts = list(range(0, size - tile + 1, tile - overlap))
+    if starts[-1] + tile < size:
+        starts.append(size - tile)
+
+    return starts
+
+
+def _tile_weights(tile: int, overlap: int) -> np.ndarray:
+    # Linear ramps over the overlap so neighboring tiles cross-fade at the seams
+    ramp = max(overlap * LATENT_SCALE, 1)
+    pixels = np.arange(tile * LATENT_SCALE, dtype="float32") + 0.5
+    return np.minimum(1.0, np.minimum(pixels, tile * LATENT_SCALE - pixels) / ramp)
+
+
+def decode_tiled(
+    decode_tile: Callable[[np.ndarray], np.ndarray],
+    latent: any,
+    tile: int,
+    overlap: int = TILE_OVERLAP,
+) -> np.ndarray:
+    """
+    Decode a latent in overlapping tiles and blend the seams.
+
+    Args:
+        decode_tile (Callable[[np.ndarray], np.ndarray]): Decodes a batch of latent
+            tiles shaped (batch, tile_height, tile_width, 4).
+        latent (any): A batch of latents shaped (batch, height / 8, width / 8, 4).
+        tile (int): The tile size in latent pixels.
+        overlap (int): The overlap between neighboring tiles in latent pixels.
+
+    Returns:
+        np.ndarray: The decoded batch shaped (batch, height, width, 3).
+    """
+
+    latent = np.asarray(latent, dtype="float32")
+    batch, height, width, _ = latent.shape
+    tile_height, tile_width = min(tile, height), min(tile, width)
+    overlap = min(overlap, tile_height - 1, tile_width - 1)
+
+    output = np.zeros(
+        (batch, height * LATENT_SCALE, width * LATENT_SCALE, 3), dtype="float32"
+    )
+    weights = np.zeros((1, height * LATENT_SCALE, width * LATENT_SCALE, 1), "float32")
+    tile_weights = np.outer(
+        _tile_weights(tile_height, overlap), _tile_weights(tile_width, overlap)
+    )[None, :, :, None]
+
+    for top in _tile_starts(height, tile_height, overlap):
+        for left in _tile_starts(width, tile_width, overlap):
+            decoded = decode_tile(
+                latent[:, top : top + tile_height, left : left + tile_width]
+            )
+            rows = slice(top * LATENT_SCALE, (top + tile_height) * LATENT_SCALE)
+            cols = slice(left * LATENT_SCALE, (left + tile_width) * LATENT_SCALE)
+            output[:, rows, cols] += np.asarray(decoded) * tile_weights
+            weights[:, rows, cols] += tile_weights
+
+    return output / weights
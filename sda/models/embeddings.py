@@ -0,0 +1,112 @@
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+
+CACHE_SIZE: int = 32
+
+
+class EmbeddingCache:
+    """
+    A bounded LRU cache of text embeddings with an optional on-disk `.npy` store.
+
+    Embeddings are keyed on the text encoder identity and the exact prompt string,
+    so changing either one never returns a stale embedding.
+    """
+
+    def __init__(
+        self,
+        encoder_id: str,
+        max_size: int = CACHE_SIZE,
+        directory: str | None = None,
+    ) -> None:
+        self.encoder_id = encoder_id
+        self.max_size = max_size
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def _key(self, prompt: str) -> str:
+        return hashlib.sha256(f"{self.encoder_id}\n{prompt}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npy")
+
+    def _remember(self, key: str, embedding: np.ndarray) -> None:
+        self._entries[key] = embedding
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get(self, prompt: str) -> np.ndarray | None:
+        """
+        Look up the embedding for a prompt in memory, then on disk.
+
+        Args:
+            prompt (str): The prompt string passed to the text encoder.
+
+        Returns:
+            np.ndarray | None: The cached embedding, or None on a miss.
+        """
+
+        key = self._key(prompt)
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        if self.directory is not None and os.path.exists(self._path(key)):
+            embedding = np.load(self._path(key))
+            self._remember(key, embedding)
+            return embedding
+
+        return None
+
+    def put(self, prompt: str, embedding: np.ndarray) -> None:
+        """
+        Store the embedding for a prompt in memory and, if enabled, on disk.
+
+        Args:
+            prompt (str): The prompt string passed to the text encoder.
+            embedding (np.ndarray): The encoded prompt.
+        """
+
+        key = self._key(prompt)
+        embedding = np.asarray(embedding)
+        self._remember(key, embedding)
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+            # Write to a temporary file first so readers never see a partial array
+            temp_path = self._path(key) + f".{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                np.save(file, embedding)
+            os.replace(temp_path, self._path(key))
+
+    def fetch(self, prompt: str, encode: Callable[[str], np.ndarray]) -> np.ndarray:
+        """
+        Return the cached embedding for a prompt, encoding and storing it on a miss.
+
+        Args:
+            prompt (str): The prompt string passed to the text encoder.
+            encode (Callable[[str], np.ndarray]): The text encoder to call on a miss.
+
+        Returns:
+            np.ndarray: The embedding for the prompt.
+        """
+
+        embedding = self.get(prompt)
+
+        if embedding is not None:
+            self.hits += 1
+            return embedding
+
+        self.misses += 1
+        embedding = encode(prompt)
+        self.put(prompt, embedding)
+        return embedding
@@ -1,8 +1,15 @@
 import os
 import random
 import yaml
+from typing import TYPE_CHECKING
 
-from .stable_diffusion import StableDiffusionWriter
+from .results import RESULT_CACHE_MB
+from .samplers import SAMPLER, SPACING
+
+# The model stack imports TensorFlow, so it is only loaded when a model is used
+if TYPE_CHECKING:
+    from .checkpoints import Checkpoint
+    from .stable_diffusion import StableDiffusionWriter
 
 PROMPT_FILENAME: str = "prompt.yml"
 PROMPT_GLUE: str = ". "
@@ -104,6 +111,24 @@ def parse_prompt(
         with open(filename, "r") as file:
             prompt.update(yaml.safe_load(file))
 
+    return join_prompt(prompt, glue)
+
+
+def join_prompt(prompt: dict, glue: str = PROMPT_GLUE) -> tuple[str, str, float]:
+    """
+    Join the includes and excludes of a prompt configuration.
+
+    Args:
+        prompt (dict): The includes, excludes and adherence of the prompt.
+        glue (str): The string used to join the prompt includes and excludes.
+
+    Returns:
+        tuple[str, str, float]: A tuple containing the includes, excludes, and adherence.
+
+    Raises:
+        ValueError: If the prompt contains invalid data.
+    """
+
     if not isinstance(prompt["includes"], list) or not isinstance(
         prompt["excludes"], list
     ):
@@ -123,46 +148,87 @@ def parse_prompt(
 def initialize_model(
     image_width: int,
     image_height: int,
-) -> StableDiffusionWriter:
+    embedding_dir: str | None = None,
+    fast_decode: bool = False,
+    decode_memory: int | None = None,
+    result_dir: str | None = None,
+    result_cache_mb: int = RESULT_CACHE_MB,
+) -> "StableDiffusionWriter":
     """
     Initializes and returns a StableDiffusionWriter instance with the specified image dimensions.
 
     Args:
         image_width (int): The width of the image in pixels. Defaults to IMAGE_WIDTH.
         image_height (int): The height of the image in pixels. Defaults to IMAGE_HEIGHT.
+        embedding_dir (str, optional): The directory used to persist text embeddings between runs. Defaults to None.
+        fast_decode (bool, optional): Use a cheap linear approximation instead of the VAE decoder. Defaults to False.
+        decode_memory (int, optional): The memory budget in megabytes for a single decoder pass; larger images are decoded in tiles. Defaults to None (no tiling).
+        result_dir (str, optional): The directory used to cache generated images between runs. Defaults to None (no result cache).
+        result_cache_mb (int, optional): The size cap of the result cache in megabytes. Defaults to RESULT_CACHE_MB.
 
     Returns:
         StableDiffusionWriter: An instance of StableDiffusionWriter configured with the given dimensions.
     """
 
-    return StableDiffusionWriter(
+    from .embeddings import EmbeddingCache
+    from .results import ResultCache
+    from .stable_diffusion import StableDiffusionWriter
+
+    model = StableDiffusionWriter(
         img_width=image_width,
         img_height=image_height,
     )
+    model.embedding_cache = EmbeddingCache(
+        model.text_encoder_id, directory=embedding_dir
+    )
+    if result_dir is not None:
+        model.result_cache = ResultCache(
+            model.model_id, result_dir, max_mb=result_cache_mb
+        )
+    model.fast_decode = fast_decode
+    model.decode_memory = decode_memory
+
+    return model
 
 
 def generate_image(
-    model: StableDiffusionWriter,
-    seed: int,
+    model: "StableDiffusionWriter",
+    seed: int | list[int],
     steps: int,
     include: str,
     exclude: str,
     adherence: float,
     internal_callback: any = None,
     external_callback: any = None,
+    fused_guidance: bool = True,
+    decode_batch_size: int = 0,
+    decode_in_background: bool = False,
+    sampler: str = SAMPLER,
+    spacing: str = SPACING,
+    resume: "Checkpoint | None" = None,
+    checkpoint_callback: any = None,
+    checkpoint_every: int = 0,
 ) -> None:
     """
     Generates an image using the Stable Diffusion model based on the provided prompts and parameters.
 
     Args:
         model (StableDiffusionWriter): The Stable Diffusion model instance used for image generation.
-        seed (int): The random seed for reproducibility of the generated image.
+        seed (int | list[int]): The random seed for reproducibility of the generated image. A list of seeds generates one image per seed in a single batch.
         steps (int): The number of diffusion steps to perform during image generation.
         include (str): The text prompt to guide the image generation process (positive prompt).
         exclude (str): The text prompt to avoid during the image generation process (negative prompt).
         adherence (float): The guidance scale for controlling adherence to the prompts.
         internal_callback (any, optional): A callback function to handle the image after each diffusion step. Defaults to None.
         external_callback (any, optional): A callback function to handle the image after all diffusion steps. Defaults to None.
+        fused_guidance (bool, optional): Run the conditional and unconditional passes as one batched call per step. Defaults to True.
+        decode_batch_size (int, optional): The number of internal frames decoded at once after their steps finish; 0 decodes each frame inside the loop. Defaults to 0.
+        decode_in_background (bool, optional): Decode internal frame batches on a background thread. Defaults to False.
+        sampler (str, optional): The sampler that turns noise predictions into the next latent. Defaults to SAMPLER.
+        spacing (str, optional): How the timesteps are spread over the schedule. Defaults to SPACING.
+        resume (Checkpoint, optional): A checkpoint of this schedule to continue from. Defaults to None.
+        checkpoint_callback (any, optional): A callback function to handle a list of checkpoints of the schedule. Defaults to None.
+        checkpoint_every (int, optional): The number of steps between checkpoints; 0 disables them. Defaults to 0.
 
     Returns:
         None: This function does not return a value. Use the callbacks to obtain the generated image(s).
@@ -176,4 +242,74 @@ def generate_image(
         unconditional_guidance_scale=adherence,
         internal_callback=internal_callback,
         external_callback=external_callback,
+        fused_guidance=fused_guidance,
+        decode_batch_size=decode_batch_size,
+        decode_in_background=decode_in_background,
+        sampler=sampler,
+        spacing=spacing,
+        resume=resume,
+        checkpoint_callback=checkpoint_callback,
+        checkpoint_every=checkpoint_every,
+    )
+
+
+def generate_sweep(
+    model: "StableDiffusionWriter",
+    seed: int,
+    steps: list[int],
+    include: str,
+    exclude: str,
+    adherence: float,
+    internal_callback: any = None,
+    external_callback: any = None,
+    max_batch_size: int | None = None,
+    decode_batch_size: int = 0,
+    decode_in_background: bool = False,
+    sampler: str = SAMPLER,
+    spacing: str = SPACING,
+    resume: "dict[int, Checkpoint] | None" = None,
+    checkpoint_callback: any = None,
+    checkpoint_every: int = 0,
+) -> None:
+    """
+    Generates one image per step count in a single diffusion sweep, where each step count is a batch member with its own timestep schedule.
+
+    Args:
+        model (StableDiffusionWriter): The Stable Diffusion model instance used for image generation.
+        seed (int): The random seed for reproducibility of the generated images.
+        steps (list[int]): The step counts to generate an image for.
+        include (str): The text prompt to guide the image generation process (positive prompt).
+        exclude (str): The text prompt to avoid during the image generation process (negative prompt).
+        adherence (float): The guidance scale for controlling adherence to the prompts.
+        internal_callback (any, optional): A callback function to handle the image after each diffusion step of the longest schedule. Defaults to None.
+        external_callback (any, optional): A callback function to handle the image after each schedule finishes. Defaults to None.
+        max_batch_size (int, optional): The maximum number of step counts passed through the UNet at once. Defaults to None (all of them).
+        decode_batch_size (int, optional): The number of internal frames decoded at once after their steps finish; 0 decodes each frame inside the loop. Defaults to 0.
+        decode_in_background (bool, optional): Decode internal frame batches on a background thread. Defaults to False.
+        sampler (str, optional): The sampler each step count gets its own instance of. Defaults to SAMPLER.
+        spacing (str, optional): How the timesteps are spread over each schedule. Defaults to SPACING.
+        resume (dict[int, Checkpoint], optional): The checkpoints step counts continue from, keyed on the step count. Defaults to None.
+        checkpoint_callback (any, optional): A callback function to handle a list of checkpoints of the unfinished schedules. Defaults to None.
+        checkpoint_every (int, optional): The number of steps between checkpoints; 0 disables them. Defaults to 0.
+
+    Returns:
+        None: This function does not return a value. Use the callbacks to obtain the generated image(s).
+    """
+
+    model.generate_sweep(
+        include_prompt=include,
+        exclude_prompt=exclude,
+        step_counts=steps,
+        unconditional_guidance_scale=adherence,
+        seed=seed,
+        external_cb=external_callback,
+        internal_cb=internal_callback,
+        max_batch_size=max_batch_size,
+        decode_batch_size=decode_batch_size,
+        decode_in_background=decode_in_background,
+        sampler=sampler,
+        spacing=spacing,
+        resume=resume,
+        checkpoint_cb=checkpoint_callback,
+        checkpoint_every=checkpoint_every,
     )
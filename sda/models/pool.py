@@ -0,0 +1,117 @@
+import gc
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from .helpers import initialize_model
+from .results import RESULT_CACHE_MB
+
+if TYPE_CHECKING:
+    from .stable_diffusion import StableDiffusionWriter
+
+POOL_MEMORY: int = 16384
+
+
+class ModelPool:
+    """
+    Keeps one model per image size and evicts the least recently used ones when
+    their weights exceed a memory cap.
+
+    Models in the pool share the text encoder, tokenizer and caches, and
+    new sizes copy their weights from an existing model instead of loading them
+    from disk again.
+    """
+
+    def __init__(
+        self,
+        memory_mb: int = POOL_MEMORY,
+        embedding_dir: str | None = None,
+        result_dir: str | None = None,
+        result_cache_mb: int = RESULT_CACHE_MB,
+    ) -> None:
+        self.memory_mb = memory_mb
+        self.embedding_dir = embedding_dir
+        self.result_dir = result_dir
+        self.result_cache_mb = result_cache_mb
+        self.builds = 0
+        self.evictions = 0
+        self._models: OrderedDict[tuple[int, int], "StableDiffusionWriter"] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def __contains__(self, size: tuple[int, int]) -> bool:
+        return self._key(*size) in self._models
+
+    @staticmethod
+    def _key(width: int, height: int) -> tuple[int, int]:
+        # The model rounds its dimensions to multiples of 128
+        return round(width / 128) * 128, round(height / 128) * 128
+
+    def get(self, width: int, height: int) -> "StableDiffusionWriter":
+        """
+        Return the model for an image size, building it on first use.
+
+        Args:
+            width (int): The image width in pixels.
+            height (int): The image height in pixels.
+
+        Returns:
+            StableDiffusionWriter: The model for the image size.
+        """
+
+        key = self._key(width, height)
+
+        if key in self._models:
+            self._models.move_to_end(key)
+            return self._models[key]
+
+        model = initialize_model(
+            width,
+            height,
+            embedding_dir=self.embedding_dir,
+            result_dir=self.result_dir,
+            result_cache_mb=self.result_cache_mb,
+        )
+
+        donor = next(reversed(self._models.values()), None)
+        if donor is not None:
+            model.share_components(donor)
+
+        self._models[key] = model
+        self.builds += 1
+        self.evict(keep=key)
+
+        return model
+
+    def used_mb(self) -> float:
+        """
+        Estimate the memory held by the weights of every model in the pool.
+
+        Returns:
+            float: The estimated memory in megabytes, counting shared parts once.
+        """
+
+        shared = next(iter(self._models.values()), None)
+        return sum(model.memory_mb() for model in self._models.values()) + (
+            shared.memory_mb(include_shared=True) - shared.memory_mb() if shared else 0
+        )
+
+    def evict(self, keep: tuple[int, int] | None = None) -> None:
+        """
+        Drop least recently used models until the pool fits its memory cap.
+
+        Args:
+            keep (tuple[int, int], optional): A size that must stay in the pool.
+        """
+
+        evicted = False
+        while len(self._models) > 1 and self.used_mb() > self.memory_mb:
+            key = next(key for key in self._models if key != keep)
+            del self._models[key]
+            self.evictions += 1
+            evicted = True
+
+        if evicted:
+            gc.collect()
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PIL import Image
+
+RESULT_CACHE_MB: int = 1024
+
+# Cached images are read back far more often than they are written
+RESULT_COMPRESS_LEVEL: int = 1
+
+# The most images waiting to be written before `put` blocks
+RESULT_QUEUE_SIZE: int = 16
+
+
+class ResultCache:
+    """
+    A content-addressed on-disk cache of generated images.
+
+    Images are keyed on the model identity and every setting that changes the
+    pixels, so a key never returns an image made differently. The files are
+    evicted least recently used first once they exceed a size cap, using their
+    modification time, which is refreshed on every hit, as the last use.
+
+    Images are encoded and written on a background thread, so storing one
+    doesn't hold up generation.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        directory: str,
+        max_mb: int = RESULT_CACHE_MB,
+    ) -> None:
+        self.model_id = model_id
+        self.directory = directory
+        self.max_bytes = max_mb * 2**20
+        self.hits = 0
+        self.misses = 0
+        self._sizes: dict[str, int] | None = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._slots = threading.BoundedSemaphore(RESULT_QUEUE_SIZE)
+
+    def key(self, settings: dict) -> str:
+        """
+        Hash the settings an image is generated with.
+
+        Args:
+            settings (dict): JSON serializable settings, such as the prompt,
+                seed, step count and sampler.
+
+        Returns:
+            str: The hex digest identifying the image.
+        """
+
+        settings = json.dumps(settings, sort_keys=True)
+        return hashlib.sha256(f"{self.model_id}\n{settings}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def _index(self) -> dict[str, int]:
+        # The sizes of the cached files are scanned once and then kept up to date
+        if self._sizes is None:
+            self._sizes = {}
+            if os.path.isdir(self.directory):
+                for entry in os.scandir(self.directory):
+                    if entry.name.endswith(".png"):
+                        self._sizes[entry.path] = entry.stat().st_size
+
+        return self._sizes
+
+    def get(self, key: str) -> Image.Image | None:
+        """
+        Load a cached image and mark it as recently used.
+
+        Args:
+            key (str): The image key.
+
+        Returns:
+            Image.Image | None: The cached image, or None on a miss.
+        """
+
+        path = self._path(key)
+
+        try:
+            with Image.open(path) as image:
+                image.load()
+            os.utime(path)
+        except OSError:
+            # Missing, evicted by another process or only partly written
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return image
+
+    def put(self, key: str, image: Image.Image) -> None:
+        """
+        Queue an image to be stored, evicting the least recently used ones over
+        the size cap once it is written.
+
+        Args:
+            key (str): The image key.
+            image (Image.Image): The generated image, which must not be changed
+                afterwards.
+        """
+
+        self._slots.acquire()
+
+        try:
+            future = self._executor.submit(self._write, key, image)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(self._done)
+
+    def _done(self, future: Future) -> None:
+        # A failed write only costs a miss later, so it never fails generation
+        future.exception()
+        self._slots.release()
+
+    def _write(self, key: str, image: Image.Image) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+
+        # Write to a temporary file first so readers never see a partial image
+        temp_path = path + f".{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(temp_path, format="PNG", compress_level=RESULT_COMPRESS_LEVEL)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            sizes = self._index()
+            sizes[path] = os.path.getsize(path)
+            self._evict(sizes, keep=path)
+
+    def _evict(self, sizes: dict[str, int], keep: str) -> None:
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        def last_used(path: str) -> int:
+            try:
+                return os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                return 0
+
+        for path in sorted(sizes, key=last_used):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+
+            total -= sizes.pop(path)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -1,14 +1,101 @@
-import math
+from contextlib import nullcontext
+
 import numpy as np
 
 from keras_cv.src.backend import ops
-from keras_cv.src.models.stable_diffusion.stable_diffusion import StableDiffusion
+from keras_cv.src.models.stable_diffusion.decoder import Decoder
+from keras_cv.src.models.stable_diffusion.diffusion_model import DiffusionModel
+from keras_cv.src.models.stable_diffusion.stable_diffusion import (
+    MAX_PROMPT_LENGTH,
+    StableDiffusion,
+)
+from keras_cv.src.version_utils import __version__ as keras_cv_version
 from tensorflow import keras
 from PIL import Image
 
+from .checkpoints import Checkpoint
+from .decoding import (
+    DeferredDecoder,
+    approximate_decode,
+    decode_tiled,
+    tile_size_for_budget,
+)
+from .embeddings import EmbeddingCache
+from .results import ResultCache
+from .samplers import SAMPLER, SPACING, make_sampler
+from ..utilities.profiling import span
+
 
 class StableDiffusionWriter(StableDiffusion):
 
+    # Identifies the text encoder weights without building the encoder
+    text_encoder_id: str = f"keras_cv-{keras_cv_version}-clip-{MAX_PROMPT_LENGTH}"
+    model_id: str = f"keras_cv-{keras_cv_version}-stable-diffusion-v1"
+    embedding_cache: EmbeddingCache | None = None
+    result_cache: ResultCache | None = None
+    fast_decode: bool = False
+    decode_memory: int | None = None
+
+    def __init__(self, img_height=512, img_width=512, jit_compile=True):
+        super().__init__(img_height, img_width, jit_compile)
+        self._tile_decoders = {}
+
+    def share_components(self, donor):
+        """
+        Reuses the resolution-independent parts of another writer.
+
+        The text encoder and tokenizer are shared outright. The diffusion model
+        and decoder have fixed input shapes, so they are rebuilt for this size
+        without downloading weights and take their weights from the donor.
+        """
+
+        self._text_encoder = donor._text_encoder
+        self._tokenizer = donor._tokenizer
+        self.embedding_cache = donor.embedding_cache
+        self.result_cache = donor.result_cache
+
+        if donor._diffusion_model is not None and self._diffusion_model is None:
+            self._diffusion_model = self._copy_weights(
+                DiffusionModel(
+                    self.img_height,
+                    self.img_width,
+                    MAX_PROMPT_LENGTH,
+                    download_weights=False,
+                ),
+                donor._diffusion_model,
+            )
+
+        if donor._decoder is not None and self._decoder is None:
+            self._decoder = self._copy_weights(
+                Decoder(self.img_height, self.img_width, download_weights=False),
+                donor._decoder,
+            )
+
+    def memory_mb(self, include_shared=False):
+        """
+        Estimates the memory held by the built component models' weights.
+        """
+
+        models = [self._diffusion_model, self._decoder, *self._tile_decoders.values()]
+        if include_shared:
+            models.append(self._text_encoder)
+
+        return sum(model.count_params() * 4 for model in models if model) / 2**20
+
+    def _copy_weights(self, model, donor):
+        model.set_weights(donor.get_weights())
+        if self.jit_compile:
+            model.compile(jit_compile=True)
+
+        return model
+
+    def encode_text(self, prompt):
+        with span("encode_text"):
+            if self.embedding_cache is None:
+                return super().encode_text(prompt)
+
+            return self.embedding_cache.fetch(prompt, super().encode_text)
+
     def text_to_image(
         self,
         include_prompt="",
@@ -18,6 +105,14 @@ class StableDiffusionWriter(StableDiffusion):
         seed=None,
         external_callback=None,
         internal_callback=None,
+        fused_guidance=True,
+        decode_batch_size=0,
+        decode_in_background=False,
+        sampler=SAMPLER,
+        spacing=SPACING,
+        resume=None,
+        checkpoint_callback=None,
+        checkpoint_every=0,
     ):
         return self.generate_image(
             include_prompt=include_prompt,
@@ -27,6 +122,14 @@ class StableDiffusionWriter(StableDiffusion):
             seed=seed,
             external_cb=external_callback,
             internal_cb=internal_callback,
+            fused_guidance=fused_guidance,
+            decode_batch_size=decode_batch_size,
+            decode_in_background=decode_in_background,
+            sampler=sampler,
+            spacing=spacing,
+            resume=resume,
+            checkpoint_cb=checkpoint_callback,
+            checkpoint_every=checkpoint_every,
         )
 
     def generate_image(
@@ -40,6 +143,14 @@ class StableDiffusionWriter(StableDiffusion):
         seed=None,
         external_cb=None,
         internal_cb=None,
+        fused_guidance=True,
+        decode_batch_size=0,
+        decode_in_background=False,
+        sampler=SAMPLER,
+        spacing=SPACING,
+        resume=None,
+        checkpoint_cb=None,
+        checkpoint_every=0,
     ):
         if diffusion_noise is not None and seed is not None:
             raise ValueError(
@@ -48,68 +159,334 @@ class StableDiffusionWriter(StableDiffusion):
                 "noise when it's not already user-specified."
             )
 
+        # A list of seeds generates one batch member per seed
+        seeds = list(seed) if isinstance(seed, (list, tuple)) else None
+        if seeds is not None:
+            batch_size = len(seeds)
+        member_seeds = seeds if seeds is not None else [seed] * batch_size
+
         encoded_text = self.encode_text(include_prompt)
         context = self._expand_tensor(encoded_text, batch_size)
 
         unconditional_text = self.encode_text(exclude_prompt)
         unconditional_context = self._expand_tensor(unconditional_text, batch_size)
 
-        latent = self._get_initial_diffusion_noise(batch_size, seed)
+        with span("noise_init", batch=batch_size):
+            if diffusion_noise is not None:
+                latent = diffusion_noise
+            elif seeds is not None:
+                latent = self._get_batch_diffusion_noise(seeds)
+            else:
+                latent = self._get_initial_diffusion_noise(batch_size, seed)
 
         # Iterative reverse diffusion stage
-        num_timesteps = 1000
-        ratio = (
-            (num_timesteps - 1) / (num_steps - 1) if num_steps > 1 else num_timesteps
-        )
-        timesteps = (np.arange(0, num_steps) * ratio).round().astype(np.int64)
+        solver = make_sampler(sampler, num_steps, spacing, member_seeds)
 
-        alphas, alphas_prev = self._get_initial_alphas(timesteps)
-        progbar = keras.utils.Progbar(len(timesteps))
+        # A checkpoint replaces the initial noise with the latent it was saved at
         iteration = 0
-        for index, timestep in list(enumerate(timesteps))[::-1]:
-            latent_prev = latent  # Set aside the previous latent vector
-            t_emb = self._get_timestep_embedding(timestep, batch_size)
-            unconditional_latent = self.diffusion_model.predict_on_batch(
-                {
-                    "latent": latent,
-                    "timestep_embedding": t_emb,
-                    "context": unconditional_context,
-                }
-            )
-            latent = self.diffusion_model.predict_on_batch(
-                {
-                    "latent": latent,
-                    "timestep_embedding": t_emb,
-                    "context": context,
-                }
-            )
-            latent = ops.array(
+        if resume is not None:
+            latent = resume.latent
+            solver.restore(resume.state)
+            iteration = resume.iteration
+
+        internal_decoder = self._internal_decoder(
+            internal_cb, decode_batch_size, decode_in_background
+        )
+        with internal_decoder or nullcontext():
+            progbar = keras.utils.Progbar(num_steps)
+            for timestep in solver.timesteps[iteration:]:
+                t_emb = self._get_timestep_embedding(timestep, batch_size)
+                noise = self._predict_noise(
+                    latent,
+                    t_emb,
+                    context,
+                    unconditional_context,
+                    unconditional_guidance_scale,
+                    fused_guidance,
+                )
+                with span("sampler_step", batch=batch_size):
+                    latent = solver.step(
+                        iteration, np.asarray(latent), np.asarray(noise)
+                    )
+
+                iteration += 1
+                progbar.update(iteration)
+
+                if internal_decoder is not None:
+                    for member, member_seed in enumerate(member_seeds):
+                        internal_decoder.add(
+                            latent[member : member + 1], member_seed, iteration
+                        )
+
+                if checkpoint_cb is not None and checkpoint_every:
+                    self._checkpoint(
+                        checkpoint_cb,
+                        checkpoint_every,
+                        iteration,
+                        internal_decoder,
+                        [Checkpoint(num_steps, iteration, latent, solver.state())],
+                    )
+
+        images = self.decode_images(latent)
+        if external_cb is not None:
+            for image, member_seed in zip(images, member_seeds):
+                external_cb(image, member_seed, iteration)
+
+        return images if seeds is not None else images[0]
+
+    def generate_sweep(
+        self,
+        include_prompt,
+        exclude_prompt=None,
+        step_counts=(50,),
+        unconditional_guidance_scale=7.5,
+        seed=None,
+        external_cb=None,
+        internal_cb=None,
+        fused_guidance=True,
+        max_batch_size=None,
+        decode_batch_size=0,
+        decode_in_background=False,
+        sampler=SAMPLER,
+        spacing=SPACING,
+        resume=None,
+        checkpoint_cb=None,
+        checkpoint_every=0,
+    ):
+        """
+        Runs the diffusion for every step count in `step_counts` at once.
+
+        Each step count is a batch member with its own sampler, all
+        starting from the same noise. Members leave the batch as soon as their
+        schedule is finished, so the sweep takes max(step_counts) iterations
+        instead of sum(step_counts). `internal_cb` only receives the frames of
+        the longest schedule.
+
+        `resume` maps step counts to the checkpoints they continue from, so
+        members can join the sweep at different iterations. Every
+        `checkpoint_every` iterations, `checkpoint_cb` receives a checkpoint of
+        each unfinished member.
+        """
+
+        step_counts = sorted(set(step_counts), reverse=True)
+        max_batch_size = max_batch_size or len(step_counts)
+
+        encoded_text = self.encode_text(include_prompt)
+        unconditional_text = self.encode_text(exclude_prompt)
+        with span("noise_init", batch=1):
+            noise = self._get_initial_diffusion_noise(1, seed)
+
+        members = [
+            {
+                "steps": num_steps,
+                "sampler": make_sampler(sampler, num_steps, spacing, [seed]),
+                "latent": noise,
+                "start": 0,
+            }
+            for num_steps in step_counts
+        ]
+
+        for member in members:
+            checkpoint = (resume or {}).get(member["steps"])
+            if checkpoint is not None:
+                member["latent"] = checkpoint.latent
+                member["sampler"].restore(checkpoint.state)
+                member["start"] = checkpoint.iteration
+
+        images = {}
+        internal_decoder = self._internal_decoder(
+            internal_cb, decode_batch_size, decode_in_background
+        )
+        with internal_decoder or nullcontext():
+            progbar = keras.utils.Progbar(step_counts[0])
+            for iteration in range(
+                min(member["start"] for member in members), step_counts[0]
+            ):
+                active = [
+                    member
+                    for member in members
+                    if member["start"] <= iteration < member["steps"]
+                ]
+
+                for start in range(0, len(active), max_batch_size):
+                    chunk = active[start : start + max_batch_size]
+                    latent = ops.concatenate(
+                        [member["latent"] for member in chunk], axis=0
+                    )
+                    t_emb = ops.concatenate(
+                        [
+                            self._get_timestep_embedding(
+                                member["sampler"].timesteps[iteration], 1
+                            )
+                            for member in chunk
+                        ],
+                        axis=0,
+                    )
+                    noise = self._predict_noise(
+                        latent,
+                        t_emb,
+                        self._expand_tensor(encoded_text, len(chunk)),
+                        self._expand_tensor(unconditional_text, len(chunk)),
+                        unconditional_guidance_scale,
+                        fused_guidance,
+                    )
+                    latent, noise = np.asarray(latent), np.asarray(noise)
+
+                    # Every member steps with its own sampler and schedule
+                    for index, member in enumerate(chunk):
+                        with span("sampler_step", batch=1):
+                            member["latent"] = member["sampler"].step(
+                                iteration,
+                                latent[index : index + 1],
+                                noise[index : index + 1],
+                            )
+
+                progbar.update(iteration + 1)
+
+                if internal_decoder is not None and members[0]["start"] <= iteration:
+                    internal_decoder.add(members[0]["latent"], seed, iteration + 1)
+
+                # Decode and drop the members whose schedule just finished
+                for member in active:
+                    if member["steps"] == iteration + 1:
+                        image = self.decode_image(member["latent"])
+                        images[member["steps"]] = image
+                        member["latent"] = None
+
+                        if external_cb is not None:
+                            external_cb(image, seed, member["steps"])
+
+                if checkpoint_cb is not None and checkpoint_every:
+                    self._checkpoint(
+                        checkpoint_cb,
+                        checkpoint_every,
+                        iteration + 1,
+                        internal_decoder,
+                        [
+                            Checkpoint(
+                                member["steps"],
+                                iteration + 1,
+                                member["latent"],
+                                member["sampler"].state(),
+                            )
+                            for member in active
+                        ],
+                    )
+
+        return images
+
+    @staticmethod
+    def _checkpoint(checkpoint_cb, every, iteration, internal_decoder, checkpoints):
+        # Finished schedules are no longer worth resuming
+        checkpoints = [
+            checkpoint
+            for checkpoint in checkpoints
+            if checkpoint.iteration < checkpoint.steps
+        ]
+        if iteration % every or not checkpoints:
+            return
+
+        with span("checkpoint"):
+            # Frames before the checkpoint must be saved before it can be resumed from
+            if internal_decoder is not None:
+                internal_decoder.flush()
+
+            checkpoint_cb(checkpoints)
+
+    def _internal_decoder(self, internal_cb, batch_size, background):
+        if internal_cb is None:
+            return None
+
+        return DeferredDecoder(self.decode_images, internal_cb, batch_size, background)
+
+    def _get_batch_diffusion_noise(self, seeds):
+        # Noise is drawn per seed so a batched image matches its unbatched run
+        return ops.concatenate(
+            [self._get_initial_diffusion_noise(1, seed) for seed in seeds], axis=0
+        )
+
+    def _predict_noise(
+        self,
+        latent,
+        t_emb,
+        context,
+        unconditional_context,
+        unconditional_guidance_scale,
+        fused_guidance=True,
+    ):
+        if fused_guidance:
+            # Run the unconditional and conditional passes as a single batch of
+            # 2 * batch_size so the UNet is only dispatched once per step
+            batch_size = latent.shape[0]
+            with span("unet", batch=2 * batch_size):
+                predicted = self.diffusion_model.predict_on_batch(
+                    {
+                        "latent": ops.concatenate([latent, latent], axis=0),
+                        "timestep_embedding": ops.concatenate([t_emb, t_emb], axis=0),
+                        "context": ops.concatenate(
+                            [unconditional_context, context], axis=0
+                        ),
+                    }
+                )
+            unconditional_latent = predicted[:batch_size]
+            latent = predicted[batch_size:]
+        else:
+            with span("unet", batch=latent.shape[0]):
+                unconditional_latent = self.diffusion_model.predict_on_batch(
+                    {
+                        "latent": latent,
+                        "timestep_embedding": t_emb,
+                        "context": unconditional_context,
+                    }
+                )
+            with span("unet", batch=latent.shape[0]):
+                latent = self.diffusion_model.predict_on_batch(
+                    {
+                        "latent": latent,
+                        "timestep_embedding": t_emb,
+                        "context": context,
+                    }
+                )
+
+        with span("guidance"):
+            return ops.array(
                 unconditional_latent
                 + unconditional_guidance_scale * (latent - unconditional_latent)
             )
-            a_t, a_prev = alphas[index], alphas_prev[index]
-            # Keras backend array need to cast explicitly
-            target_dtype = latent_prev.dtype
-            latent = ops.cast(latent, target_dtype)
-            pred_x0 = (latent_prev - math.sqrt(1 - a_t) * latent) / math.sqrt(a_t)
-            latent = (
-                ops.array(latent) * math.sqrt(1.0 - a_prev)
-                + math.sqrt(a_prev) * pred_x0
-            )
 
-            iteration += 1
-            progbar.update(iteration)
+    def decode_image(self, latent) -> Image.Image:
+        return self.decode_images(latent)[0]
 
-            if internal_cb is not None:
-                internal_cb(self.decode_image(latent), seed, iteration)
+    def decode_images(self, latent) -> list[Image.Image]:
+        with span("decode_image", batch=latent.shape[0]):
+            if self.fast_decode:
+                return [Image.fromarray(image) for image in approximate_decode(latent)]
 
-        image = self.decode_image(latent)
-        if external_cb is not None:
-            external_cb(image, seed, iteration)
+            tile = (
+                tile_size_for_budget(self.decode_memory) if self.decode_memory else None
+            )
+            if tile is not None and max(latent.shape[1:3]) > tile:
+                decoded = decode_tiled(self._decode_tile, latent, tile)
+            else:
+                decoded = self.decoder.predict_on_batch(latent)
 
-        return image
+            decoded = ((decoded + 1) / 2) * 255
+            return [
+                Image.fromarray(image)
+                for image in np.clip(decoded, 0, 255).astype("uint8")
+            ]
 
-    def decode_image(self, latent) -> Image.Image:
-        decoded = self.decoder.predict_on_batch(latent)
-        decoded = ((decoded + 1) / 2) * 255
-        return Image.fromarray(np.clip(decoded, 0, 255).astype("uint8")[0])
+    def _decode_tile(self, latent):
+        # The decoder's input shape is fixed, so each tile size gets its own
+        # decoder sharing the weights of the full-size one
+        key = latent.shape[1:3]
+
+        if key not in self._tile_decoders:
+            self._tile_decoders[key] = self._copy_weights(
+                Decoder(
+                    key[0] * 8, key[1] * 8, name="tile_decoder", download_weights=False
+                ),
+                self.decoder,
+            )
+
+        return self._tile_decoders[key].predict_on_batch(latent)
@@ -1,34 +1,289 @@
+import hashlib
+import io
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import NamedTuple
 
 from PIL import Image
 
+from .manifest import (
+    MANIFEST_NAME,
+    is_current,
+    read_manifest,
+    record_image,
+    remove_manifest,
+)
+from .profiling import span
+
 WIDTH = 512
 HEIGHT = 512
 FORMAT = "png"
+FORMATS = ("png", "webp")
+
+# Pillow's default; 1 is several times faster for slightly larger files
+PNG_COMPRESS_LEVEL = 6
+
+WRITER_THREADS = 2
+WRITER_QUEUE_SIZE = 16
 
 DIR_PREVIEWS = "images"
 DIR_INTERNAL = "internal"
 DIR_EXTERNAL = "external"
+DIR_CACHE = ".cache"
+
+
+class ImageFile(NamedTuple):
+    """
+    A lazy handle to a saved image and the seed and step parsed from its name.
+    """
+
+    path: str
+    seed: int
+    step: int
 
+    def open(self) -> Image.Image:
+        """
+        Load the image from disk.
 
-def save_image(image: Image.Image, seed: int, step: int, output_dir: str):
+        Returns:
+            Image.Image: The decoded RGB image.
+        """
+
+        with Image.open(self.path) as image:
+            return image.convert("RGB")
+
+
+def save_image(
+    image: Image.Image,
+    seed: int,
+    step: int,
+    output_dir: str,
+    image_format: str = FORMAT,
+    compress_level: int = PNG_COMPRESS_LEVEL,
+    prompt: str | None = None,
+    sampler: str | None = None,
+):
     """
-    Save the image to disk.
+    Save the image to disk and record it in the directory's manifest.
 
     Args:
         image (Image.Image): The image to save.
         seed (int): The seed used to generate the image.
         step (int): The number of steps used to generate the image.
         output_dir (str): The directory to save the image.
+        image_format (str): Either "png" or "webp", which is saved losslessly.
+        compress_level (int): The PNG compression level from 0 to 9.
+        prompt (str, optional): The hash of the prompt settings for the manifest.
+        sampler (str, optional): The identifier of the sampler for the manifest.
 
     Returns:
         None
     """
 
-    os.makedirs(output_dir, exist_ok=True)
+    with span("save_image", format=image_format):
+        os.makedirs(output_dir, exist_ok=True)
+
+        buffer = io.BytesIO()
+        if image_format == "webp":
+            image.save(buffer, format="webp", lossless=True)
+        else:
+            image.save(buffer, format="png", compress_level=compress_level)
+        data = buffer.getvalue()
+
+        filename = f"{seed:04d}-{step:03d}.{image_format}"
+        path = os.path.join(output_dir, filename)
+
+        # Write to a temporary file first so readers never see a partial image
+        temp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        record_image(
+            output_dir,
+            filename,
+            seed,
+            step,
+            image.size,
+            hashlib.sha256(data).hexdigest(),
+            prompt,
+            sampler,
+            partial(_existing_images, output_dir),
+        )
+
+
+def _existing_images(directory: str) -> list[tuple]:
+    # Indexes the images saved before the directory's manifest was created
+    images = []
+    for name in _image_names(directory):
+        with open(os.path.join(directory, name), "rb") as file:
+            data = file.read()
+        with Image.open(io.BytesIO(data)) as image:
+            size = image.size
+
+        checksum = hashlib.sha256(data).hexdigest()
+        images.append((name, *_parse_image_name(name), size, checksum))
+
+    return images
+
+
+class ImageWriter:
+    """
+    Saves images on background threads so encoding and disk writes overlap with
+    generation.
+
+    At most `queue_size` images wait to be written, after which `save` blocks
+    until a thread catches up. The first error raised while writing is raised
+    again from the next `save`, `flush` or `close`, and leaving the context
+    waits for every queued image.
+    """
+
+    def __init__(
+        self,
+        image_format: str = FORMAT,
+        compress_level: int = PNG_COMPRESS_LEVEL,
+        threads: int = WRITER_THREADS,
+        queue_size: int = WRITER_QUEUE_SIZE,
+        prompt: str | None = None,
+        sampler: str | None = None,
+    ) -> None:
+        self.image_format = image_format
+        self.compress_level = compress_level
+        self.prompt = prompt
+        self.sampler = sampler
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._futures: set[Future] = set()
+        self._lock = threading.Lock()
+        self._error: BaseException | None = None
+
+    def __enter__(self) -> "ImageWriter":
+        return self
+
+    def __exit__(self, exc_type, *exc_info) -> None:
+        try:
+            self.close()
+        except Exception:
+            # Don't hide the error that is already leaving the context
+            if exc_type is None:
+                raise
+
+    def save(self, image: Image.Image, seed: int, step: int, output_dir: str) -> None:
+        """
+        Queue an image to be saved, with the same arguments as `save_image`.
+
+        Raises:
+            Exception: An error raised while writing an earlier image.
+        """
+
+        self._raise_error()
+        self._slots.acquire()
+
+        try:
+            future = self._executor.submit(
+                save_image,
+                image,
+                seed,
+                step,
+                output_dir,
+                self.image_format,
+                self.compress_level,
+                self.prompt,
+                self.sampler,
+            )
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def flush(self) -> None:
+        """
+        Wait until every queued image has been written.
+
+        Raises:
+            Exception: The first error raised while writing an image.
+        """
+
+        while True:
+            with self._lock:
+                futures = list(self._futures)
+            if not futures:
+                break
+
+            for future in futures:
+                future.exception()
+
+        self._raise_error()
+
+    def close(self) -> None:
+        """
+        Write every queued image and stop the writer threads.
+
+        Raises:
+            Exception: The first error raised while writing an image.
+        """
+
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+            if self._error is None and future.exception() is not None:
+                self._error = future.exception()
+
+        self._slots.release()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+
+def _image_names(
+    directory: str, extension: str | tuple[str, ...] = FORMATS
+) -> list[str]:
+    return [name for name in os.listdir(directory) if name.endswith(extension)]
+
+
+def image_records(
+    directory: str, extension: str | tuple[str, ...] = FORMATS
+) -> list[dict] | None:
+    """
+    Read the manifest records of the images in a directory.
+
+    The manifest is trusted while it is current. Once files were added or
+    removed without it, it is checked against the directory listing, so images
+    saved by another tool are never hidden.
+
+    Args:
+        directory (str): The image directory.
+        extension (str | tuple[str, ...]): The file extensions to filter by.
+
+    Returns:
+        list[dict] | None: The records of the images still in the directory,
+            sorted by seed and step, or None if any image is not recorded.
+    """
+
+    records = read_manifest(directory)
+    if records is None:
+        return None
 
-    filename = f"{seed:04d}-{step:03d}.{FORMAT}"
-    image.save(os.path.join(output_dir, filename))
+    if is_current(directory):
+        return [record for record in records if record["path"].endswith(extension)]
+
+    names = set(_image_names(directory, extension))
+    records = [record for record in records if record["path"] in names]
+    if len(records) < len(names):
+        return None
+
+    return records
 
 
 def is_empty(directory: str) -> bool:
@@ -45,7 +300,11 @@ def is_empty(directory: str) -> bool:
     if not os.path.exists(directory):
         return True
 
-    return not bool(os.listdir(directory))
+    records = read_manifest(directory) if is_current(directory) else None
+    if records is not None:
+        return not records
+
+    return not any(name != MANIFEST_NAME for name in os.listdir(directory))
 
 
 def empty_dir(directory: str) -> None:
@@ -56,8 +315,17 @@ def empty_dir(directory: str) -> None:
         directory (str): The directory to clear.
     """
 
-    for file in os.listdir(directory):
-        os.remove(os.path.join(directory, file))
+    for name in os.listdir(directory):
+        if name == MANIFEST_NAME:
+            continue
+
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            # Removed by another process since the directory was listed
+            pass
+
+    remove_manifest(directory)
 
 
 def _parse_image_name(name: str) -> tuple[int, int]:
@@ -76,24 +344,33 @@ def _parse_image_name(name: str) -> tuple[int, int]:
 
 
 def list_dir(
-    directory: str, extension: str = FORMAT
-) -> list[tuple[Image.Image, str, str]]:
+    directory: str, extension: str | tuple[str, ...] = FORMATS
+) -> list[ImageFile]:
     """
-    List all files in a directory.
+    List all images in a directory without loading them.
+
+    Images are read from the directory's manifest, falling back to parsing the
+    file names when there is no manifest or it misses any image.
 
     Args:
         directory (str): The directory to list.
-        extension (str): The file extension to filter by.
+        extension (str | tuple[str, ...]): The file extensions to filter by.
 
     Returns:
-        list[str]: A list of all files in the directory.
+        list[ImageFile]: A handle for each image, sorted by seed and step.
     """
 
-    files = [name for name in sorted(os.listdir(directory)) if name.endswith(extension)]
-
-    for index, name in enumerate(files):
-        seed, step = _parse_image_name(name)
-        image = Image.open(os.path.join(directory, name))
-        files[index] = (image, seed, step)
+    records = image_records(directory, extension)
+    if records is not None:
+        return [
+            ImageFile(
+                os.path.join(directory, record["path"]), record["seed"], record["step"]
+            )
+            for record in records
+        ]
 
-    return files
+    images = [
+        ImageFile(os.path.join(directory, name), *_parse_image_name(name))
+        for name in _image_names(directory, extension)
+    ]
+    return sorted(images, key=lambda image: (image.seed, image.step))
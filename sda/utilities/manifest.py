@@ -0,0 +1,199 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from typing import Callable
+
+MANIFEST_NAME = "manifest.jsonl"
+
+_locks: dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+# Parsed manifests keyed on their path, reused while the file is unchanged
+_cache: dict[str, tuple[tuple[int, int], list[dict]]] = {}
+
+
+def _lock(path: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def manifest_path(directory: str) -> str:
+    """
+    Get the path of a directory's manifest.
+
+    Args:
+        directory (str): The image directory.
+
+    Returns:
+        str: The path of the manifest file.
+    """
+
+    return os.path.join(directory, MANIFEST_NAME)
+
+
+def prompt_hash(include: str, exclude: str, adherence: float) -> str:
+    """
+    Hash the prompt settings an image was generated with.
+
+    Args:
+        include (str): The positive prompt.
+        exclude (str): The negative prompt.
+        adherence (float): The guidance scale.
+
+    Returns:
+        str: A short hex digest of the prompt settings.
+    """
+
+    prompt = json.dumps([include, exclude, adherence])
+    return hashlib.sha256(prompt.encode()).hexdigest()[:16]
+
+
+def is_current(directory: str) -> bool:
+    """
+    Check if a directory's manifest was written since its files last changed.
+
+    Saving an image records it right after moving it into the directory, so a
+    directory changed after its manifest holds files added or removed without it.
+
+    Args:
+        directory (str): The image directory.
+
+    Returns:
+        bool: True if the manifest can be trusted to list every image.
+    """
+
+    try:
+        return (
+            os.stat(manifest_path(directory)).st_mtime_ns
+            >= os.stat(directory).st_mtime_ns
+        )
+    except FileNotFoundError:
+        return False
+
+
+def _record(
+    filename: str,
+    seed: int,
+    step: int,
+    size: tuple[int, int],
+    checksum: str,
+    prompt: str | None = None,
+    sampler: str | None = None,
+) -> str:
+    record = {
+        "seed": seed,
+        "step": step,
+        "prompt": prompt,
+        "sampler": sampler,
+        "width": size[0],
+        "height": size[1],
+        "path": filename,
+        "checksum": checksum,
+    }
+    return json.dumps(record) + "\n"
+
+
+def record_image(
+    directory: str,
+    filename: str,
+    seed: int,
+    step: int,
+    size: tuple[int, int],
+    checksum: str,
+    prompt: str | None = None,
+    sampler: str | None = None,
+    existing: Callable[[], list[tuple]] | None = None,
+) -> None:
+    """
+    Append a saved image to its directory's manifest.
+
+    The manifest is locked while the record is appended, so processes on other
+    machines sharing the directory can record images into it at the same time.
+
+    Args:
+        directory (str): The directory the image was saved in.
+        filename (str): The image's file name within the directory.
+        seed (int): The seed used to generate the image.
+        step (int): The number of steps used to generate the image.
+        size (tuple[int, int]): The image width and height.
+        checksum (str): The SHA-256 digest of the image file.
+        prompt (str, optional): The hash of the prompt settings.
+        sampler (str, optional): The identifier of the sampler and its spacing.
+        existing (Callable[[], list[tuple]], optional): Lists the filename, seed,
+            step, size and checksum of the images already in the directory. It
+            is only called when the manifest is created, so images saved before
+            it existed are recorded too.
+    """
+
+    path = manifest_path(directory)
+
+    with _lock(path), open(path, "a") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        if existing is not None and os.fstat(file.fileno()).st_size == 0:
+            for other in existing():
+                if other[0] != filename:
+                    file.write(_record(*other))
+
+        file.write(_record(filename, seed, step, size, checksum, prompt, sampler))
+
+
+def read_manifest(directory: str) -> list[dict] | None:
+    """
+    Read the images recorded in a directory's manifest.
+
+    Args:
+        directory (str): The image directory.
+
+    Returns:
+        list[dict] | None: The latest record for each file, sorted by seed and
+            step, or None if there is no manifest. Files may have been added or
+            removed without it since, which `is_current` tells.
+    """
+
+    path = manifest_path(directory)
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    records = {}
+    with _lock(path), open(path) as file:
+        fcntl.flock(file, fcntl.LOCK_SH)
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Blank or still being appended by another process
+                continue
+
+            records[record["path"]] = record
+
+    records = sorted(
+        records.values(), key=lambda record: (record["seed"], record["step"])
+    )
+    _cache[path] = (version, records)
+    return records
+
+
+def remove_manifest(directory: str) -> None:
+    """
+    Delete a directory's manifest if it has one.
+
+    Args:
+        directory (str): The image directory.
+    """
+
+    path = manifest_path(directory)
+
+    with _lock(path):
+        _cache.pop(path, None)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,282 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Iterator
+
+# How often the resident memory of the process is sampled, in seconds
+RSS_INTERVAL: float = 0.05
+
+_profiler: "Profiler | None" = None
+_disabled = nullcontext()
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as file:
+            pages = int(file.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, IndexError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def _percentile(times: list[int], fraction: float) -> int:
+    # Nearest rank on a sorted list
+    return times[min(int(fraction * len(times)), len(times) - 1)]
+
+
+class _Span:
+    __slots__ = ("_profiler", "_name", "_args", "_start")
+
+    def __init__(self, profiler: "Profiler", name: str, args: dict) -> None:
+        self._profiler = profiler
+        self._name = name
+        self._args = args
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info) -> None:
+        self._profiler.record(
+            self._name, self._start, time.perf_counter_ns(), self._args
+        )
+
+
+class Profiler:
+    """
+    Records timed spans and resident memory samples as a Chrome trace.
+
+    Spans can be recorded from any thread. The trace opens in Perfetto or
+    `chrome://tracing`, with one row per thread and the memory as a counter.
+    """
+
+    def __init__(self, rss_interval: float = RSS_INTERVAL) -> None:
+        self.rss_interval = rss_interval
+        self.peak_rss_mb = 0.0
+        self._origin = time.perf_counter_ns()
+        self._events: list[dict] = []
+        self._spans: dict[str, list[int]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler: threading.Thread | None = None
+
+    def _timestamp(self, ns: int) -> float:
+        # Chrome traces count microseconds from the start of the trace
+        return (ns - self._origin) / 1000
+
+    def record(self, name: str, start: int, end: int, args: dict) -> None:
+        """
+        Record a finished span.
+
+        Args:
+            name (str): The name of the stage.
+            start (int): The `time.perf_counter_ns` the span started at.
+            end (int): The `time.perf_counter_ns` the span ended at.
+            args (dict): JSON serializable details shown with the span.
+        """
+
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": self._timestamp(start),
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+
+        with self._lock:
+            self._events.append(event)
+            self._spans.setdefault(name, []).append(end - start)
+
+    def sample_rss(self) -> None:
+        """
+        Record the resident memory of the process.
+        """
+
+        rss = _rss_mb()
+        with self._lock:
+            self.peak_rss_mb = max(self.peak_rss_mb, rss)
+            self._events.append(
+                {
+                    "name": "rss",
+                    "ph": "C",
+                    "ts": self._timestamp(time.perf_counter_ns()),
+                    "pid": os.getpid(),
+                    "args": {"MB": round(rss, 1)},
+                }
+            )
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self.rss_interval):
+            self.sample_rss()
+
+    def start(self) -> None:
+        """
+        Start sampling memory on a background thread.
+        """
+
+        self.sample_rss()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """
+        Stop sampling memory.
+        """
+
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+        self.sample_rss()
+        self.peak_rss_mb = max(self.peak_rss_mb, _peak_rss_mb())
+
+    def aggregates(self) -> list[dict]:
+        """
+        Summarize the spans of every stage.
+
+        Returns:
+            list[dict]: The name, count and total, mean, 50th, 90th and 99th
+                percentile and maximum milliseconds of each stage, the slowest
+                total first.
+        """
+
+        stats = []
+        with self._lock:
+            spans = {name: sorted(times) for name, times in self._spans.items()}
+
+        for name, times in spans.items():
+            stats.append(
+                {
+                    "name": name,
+                    "count": len(times),
+                    "total_ms": sum(times) / 1e6,
+                    "mean_ms": sum(times) / len(times) / 1e6,
+                    "p50_ms": _percentile(times, 0.5) / 1e6,
+                    "p90_ms": _percentile(times, 0.9) / 1e6,
+                    "p99_ms": _percentile(times, 0.99) / 1e6,
+                    "max_ms": times[-1] / 1e6,
+                }
+            )
+
+        return sorted(stats, key=lambda stat: stat["total_ms"], reverse=True)
+
+    def write(self, path: str) -> None:
+        """
+        Write the trace as Chrome trace JSON.
+
+        Args:
+            path (str): The path of the trace file.
+        """
+
+        stages = self.aggregates()
+        with self._lock:
+            trace = {
+                "traceEvents": list(self._events),
+                "displayTimeUnit": "ms",
+                "otherData": {
+                    "peak_rss_mb": round(self.peak_rss_mb, 1),
+                    "wall_ms": (time.perf_counter_ns() - self._origin) / 1e6,
+                    "stages": stages,
+                },
+            }
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(trace, file)
+
+
+def span(name: str, **args: any) -> any:
+    """
+    Time a block of code as a stage of the current profile.
+
+    Does nothing, at the cost of one global lookup, when profiling is off.
+
+    Args:
+        name (str): The name of the stage.
+        **args: JSON serializable details shown with the span.
+
+    Returns:
+        A context manager timing the block.
+    """
+
+    profiler = _profiler
+    if profiler is None:
+        return _disabled
+
+    return _Span(profiler, name, args)
+
+
+def timed(name: str, iterator: Iterator[any]) -> Iterator[any]:
+    """
+    Time producing each item of a lazy iterator as a stage.
+
+    Args:
+        name (str): The name of the stage.
+        iterator (Iterator[any]): The iterator to time.
+
+    Returns:
+        Iterator[any]: The same items, or the iterator itself when profiling is off.
+    """
+
+    profiler = _profiler
+    if profiler is None:
+        return iterator
+
+    def items() -> Iterator[any]:
+        while True:
+            start = time.perf_counter_ns()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+
+            profiler.record(name, start, time.perf_counter_ns(), {})
+            yield item
+
+    return items()
+
+
+@contextmanager
+def profiling(path: str | None) -> Iterator["Profiler | None"]:
+    """
+    Profile the stages run inside the block and write the trace when it ends.
+
+    Args:
+        path (str, optional): The path of the trace file, or None to not profile.
+
+    Yields:
+        Profiler | None: The profiler, or None when not profiling.
+    """
+
+    global _profiler
+
+    if not path:
+        yield None
+        return
+
+    profiler = Profiler()
+    profiler.start()
+    _profiler = profiler
+
+    try:
+        yield profiler
+    finally:
+        _profiler = None
+        profiler.stop()
+        profiler.write(path)
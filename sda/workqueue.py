@@ -0,0 +1,571 @@
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sys
+import time
+import traceback
+import uuid
+from typing import Callable, Iterator
+
+from .utilities.images import FORMAT, PNG_COMPRESS_LEVEL
+
+QUEUE_DIR: str = os.path.join(".cache", "queue")
+POLL_INTERVAL: float = 0.5
+
+HEARTBEAT: str = "heartbeat.json"
+
+# How long a coordinator on another machine may go without a heartbeat before
+# its run is taken as abandoned, which also allows for clocks that differ
+HEARTBEAT_TIMEOUT: float = 60.0
+
+# Job files move between these folders, so a job is in exactly one of them
+PENDING: str = "pending"
+CLAIMED: str = "claimed"
+DONE: str = "done"
+FAILED: str = "failed"
+
+SayCallback = Callable[..., None]
+
+
+def worker_id() -> str:
+    """
+    Name this process uniquely across the machines sharing a queue.
+
+    Returns:
+        str: The host name and process id.
+    """
+
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def pin_threads(threads: int) -> None:
+    """
+    Limit the threads TensorFlow runs operations on in this process.
+
+    Must be called before TensorFlow runs its first operation.
+
+    Args:
+        threads (int): The number of threads used inside each operation, or 0
+            to keep TensorFlow's default of one per core.
+    """
+
+    if threads <= 0:
+        return
+
+    import tensorflow as tf
+
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+
+def _write_json(path: str, data: dict) -> None:
+    # Write to a temporary file first so other processes never see a partial job
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "w") as file:
+        json.dump(data, file)
+    os.replace(temp_path, path)
+
+
+class JobQueue:
+    """
+    A queue of preview images in a directory that several processes, on one
+    machine or on several sharing the directory, take jobs from.
+
+    Every job is a JSON file that starts in `pending/`. A worker claims a job by
+    renaming it into `claimed/`, which only one worker can do, and moves it to
+    `done/` or `failed/` with its result once the image is saved. The
+    coordinator of the run keeps `heartbeat.json` fresh, so workers can skip
+    runs it left behind.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @classmethod
+    def create(cls, root: str = QUEUE_DIR) -> "JobQueue":
+        """
+        Create an empty queue for a new run.
+
+        Args:
+            root (str): The directory shared by the coordinator and workers.
+
+        Returns:
+            JobQueue: The new queue.
+        """
+
+        # Names sort by creation time, so workers take the oldest run first
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        queue = cls(os.path.join(os.path.abspath(root), name))
+        for state in (PENDING, CLAIMED, DONE, FAILED):
+            os.makedirs(os.path.join(queue.directory, state))
+
+        _write_json(
+            os.path.join(queue.directory, HEARTBEAT),
+            {"host": socket.gethostname(), "pid": os.getpid()},
+        )
+        return queue
+
+    @staticmethod
+    def runs(root: str = QUEUE_DIR) -> list["JobQueue"]:
+        """
+        Find the queues of every run under a shared directory.
+
+        Args:
+            root (str): The directory shared by the coordinator and workers.
+
+        Returns:
+            list[JobQueue]: The queues, oldest first.
+        """
+
+        if not os.path.isdir(root):
+            return []
+
+        return [JobQueue(os.path.join(root, name)) for name in sorted(os.listdir(root))]
+
+    def beat(self) -> None:
+        """
+        Mark the coordinator of the run as still running.
+        """
+
+        os.utime(os.path.join(self.directory, HEARTBEAT))
+
+    def orphaned(self) -> bool:
+        """
+        Check whether the coordinator of the run stopped without removing it.
+
+        A coordinator on this machine is looked up by its process id, and one on
+        another machine is taken as stopped once its heartbeat is older than
+        `HEARTBEAT_TIMEOUT`.
+
+        Returns:
+            bool: True if no coordinator is waiting for the run's results.
+        """
+
+        path = os.path.join(self.directory, HEARTBEAT)
+
+        try:
+            with open(path) as file:
+                coordinator = json.load(file)
+            age = time.time() - os.stat(path).st_mtime
+        except FileNotFoundError:
+            # Still being created, or already removed with nothing left to claim
+            return False
+
+        if coordinator["host"] != socket.gethostname():
+            return age > HEARTBEAT_TIMEOUT
+
+        try:
+            os.kill(coordinator["pid"], 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+
+        return False
+
+    def _path(self, state: str, name: str = "") -> str:
+        return os.path.join(self.directory, state, name)
+
+    def _names(self, state: str) -> list[str]:
+        try:
+            names = os.listdir(self._path(state))
+        except FileNotFoundError:
+            return []
+
+        return sorted(name for name in names if name.endswith(".json"))
+
+    def put(self, jobs: list[dict]) -> None:
+        """
+        Add jobs to the queue.
+
+        Args:
+            jobs (list[dict]): The options of each job.
+        """
+
+        for index, job in enumerate(jobs):
+            _write_json(self._path(PENDING, f"{index:06d}.json"), job)
+
+    def claim(self, worker: str) -> tuple[str, dict] | None:
+        """
+        Take the next pending job.
+
+        Args:
+            worker (str): The name of the claiming worker.
+
+        Returns:
+            tuple[str, dict] | None: The job name and options, or None if no
+                job is pending.
+        """
+
+        for name in self._names(PENDING):
+            claimed = self._path(CLAIMED, f"{name[:-5]}.{worker}.json")
+
+            # Renaming is atomic, so only one worker wins each job
+            try:
+                os.rename(self._path(PENDING, name), claimed)
+            except FileNotFoundError:
+                continue
+
+            with open(claimed) as file:
+                return name, json.load(file)
+
+        return None
+
+    def finish(
+        self, name: str, worker: str, result: dict, failed: bool = False
+    ) -> bool:
+        """
+        Record the result of a claimed job.
+
+        Args:
+            name (str): The job name returned by `claim`.
+            worker (str): The name of the worker that claimed it.
+            result (dict): What the worker reports back, merged into the job.
+            failed (bool): Whether the job raised an error.
+
+        Returns:
+            bool: False if the run was removed before the result was recorded.
+        """
+
+        claimed = self._path(CLAIMED, f"{name[:-5]}.{worker}.json")
+
+        # The coordinator removes the run when it stops, even with jobs claimed
+        try:
+            with open(claimed) as file:
+                job = json.load(file)
+
+            _write_json(
+                self._path(FAILED if failed else DONE, name),
+                {**job, **result, "worker": worker},
+            )
+            os.remove(claimed)
+        except FileNotFoundError:
+            return False
+
+        return True
+
+    def release(self, name: str, worker: str) -> None:
+        """
+        Return a claimed job to the queue for another worker to take.
+
+        Args:
+            name (str): The job name returned by `claim`.
+            worker (str): The name of the worker that claimed it.
+        """
+
+        os.rename(
+            self._path(CLAIMED, f"{name[:-5]}.{worker}.json"), self._path(PENDING, name)
+        )
+
+    def abandon(self, worker: str) -> int:
+        """
+        Fail the jobs a worker claimed but stopped before finishing.
+
+        Args:
+            worker (str): The name of the stopped worker.
+
+        Returns:
+            int: The number of jobs failed.
+        """
+
+        suffix = f".{worker}.json"
+        names = [name for name in self._names(CLAIMED) if name.endswith(suffix)]
+
+        for name in names:
+            self.finish(
+                name.removesuffix(suffix) + ".json",
+                worker,
+                {"error": "The worker stopped before finishing the job."},
+                failed=True,
+            )
+
+        return len(names)
+
+    def cancel(self, worker: str, error: str) -> int:
+        """
+        Fail every pending job, so no worker takes it.
+
+        Args:
+            worker (str): The name the jobs are failed under.
+            error (str): Why the jobs were failed.
+
+        Returns:
+            int: The number of jobs failed.
+        """
+
+        count = 0
+        while (claim := self.claim(worker)) is not None:
+            self.finish(claim[0], worker, {"error": error}, failed=True)
+            count += 1
+
+        return count
+
+    def results(self, seen: set[str]) -> Iterator[tuple[str, dict]]:
+        """
+        Yield the results of finished jobs that have not been seen yet.
+
+        Args:
+            seen (set[str]): The names of the jobs already yielded, which is updated.
+
+        Yields:
+            tuple[str, dict]: The state, "done" or "failed", and the job result.
+        """
+
+        for state in (DONE, FAILED):
+            for name in self._names(state):
+                if name in seen:
+                    continue
+
+                seen.add(name)
+                with open(self._path(state, name)) as file:
+                    yield state, json.load(file)
+
+    def remove(self) -> None:
+        """
+        Delete the queue once its run is over.
+        """
+
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _save(job: dict) -> Callable:
+    from .models.samplers import SAMPLERS
+    from .utilities.images import save_image
+
+    sampler = SAMPLERS[job["sampler"]].identifier(job["spacing"])
+
+    def save(image: any, seed: int, step: int, directory: str) -> None:
+        save_image(
+            image,
+            seed,
+            step,
+            job["output_dir"],
+            job.get("image_format", FORMAT),
+            job.get("compress_level", PNG_COMPRESS_LEVEL),
+            job.get("prompt"),
+            sampler,
+        )
+
+    return save
+
+
+def run_worker(
+    root: str = QUEUE_DIR,
+    threads: int = 0,
+    wait: bool = False,
+    embedding_dir: str | None = None,
+    result_dir: str | None = None,
+    say: SayCallback | None = print,
+) -> int:
+    """
+    Render jobs from every queue under a shared directory until none are left.
+
+    Args:
+        root (str): The directory shared by the coordinator and workers.
+        threads (int): The TensorFlow threads per operation, or 0 for all cores.
+        wait (bool): Keep polling for new jobs instead of exiting when idle.
+        embedding_dir (str, optional): The directory text embeddings are cached in.
+        result_dir (str, optional): The directory generated images are cached in.
+        say (SayCallback, optional): Called with progress messages.
+
+    Returns:
+        int: The number of jobs rendered.
+    """
+
+    from .jobs import run_preview
+    from .models.pool import ModelPool
+
+    pin_threads(threads)
+
+    worker = worker_id()
+    pool = ModelPool(embedding_dir=embedding_dir, result_dir=result_dir)
+    quiet = lambda *parts: None
+    count = 0
+
+    while True:
+        claim = next(
+            (
+                (queue, claimed)
+                for queue in JobQueue.runs(root)
+                if not queue.orphaned() and (claimed := queue.claim(worker)) is not None
+            ),
+            None,
+        )
+
+        if claim is None:
+            if not wait:
+                return count
+
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        queue, (name, job) = claim
+        start = time.perf_counter()
+        label = f"seed {job['seed']} over {job['step']} steps"
+
+        try:
+            model = pool.get(job["width"], job["height"])
+            model.fast_decode = job.get("fast_decode", False)
+            model.decode_memory = job.get("decode_memory") or None
+
+            run_preview(
+                model,
+                [job["seed"]],
+                [job["step"]],
+                job["include"],
+                job["exclude"],
+                job["adherence"],
+                save=_save(job),
+                say=quiet,
+                sampler=job["sampler"],
+                spacing=job["spacing"],
+            )
+        except KeyboardInterrupt:
+            queue.release(name, worker)
+            raise
+        except Exception as error:
+            message = f"{type(error).__name__}: {error}"
+            queue.finish(
+                name,
+                worker,
+                {"error": message, "trace": traceback.format_exc()},
+                failed=True,
+            )
+            if say is not None:
+                say(":x: [bold red]Error[/bold red]:", f"Failed {label}: {message}")
+        else:
+            seconds = time.perf_counter() - start
+            if not queue.finish(name, worker, {"seconds": round(seconds, 3)}):
+                continue
+
+            count += 1
+            if say is not None:
+                say(
+                    f":robot: [bold blue]Worker {worker}[/bold blue]:",
+                    f"Rendered {label} in {seconds:.1f}s",
+                )
+
+
+def local_worker(
+    root: str, threads: int, embedding_dir: str | None, result_dir: str | None
+) -> None:
+    """
+    The entry point of a worker process started by the coordinator.
+
+    Args:
+        root (str): The directory shared by the coordinator and workers.
+        threads (int): The TensorFlow threads per operation.
+        embedding_dir (str, optional): The directory text embeddings are cached in.
+        result_dir (str, optional): The directory generated images are cached in.
+    """
+
+    # The coordinator reports progress, so the worker's own output is dropped
+    sys.stdout = open(os.devnull, "w")
+
+    # Ctrl+C reaches the whole process group, and the coordinator reports it
+    try:
+        run_worker(
+            root, threads, embedding_dir=embedding_dir, result_dir=result_dir, say=None
+        )
+    except KeyboardInterrupt:
+        pass
+
+
+def run_coordinator(
+    jobs: list[dict],
+    workers: int,
+    say: SayCallback,
+    root: str = QUEUE_DIR,
+    threads: int = 0,
+    embedding_dir: str | None = None,
+    result_dir: str | None = None,
+) -> tuple[int, int]:
+    """
+    Queue jobs, start local workers and report results until every job finishes.
+
+    Workers started with `sda worker` on the same shared directory, on this or
+    other machines, take jobs from the queue alongside the local ones.
+
+    Args:
+        jobs (list[dict]): The options of each preview image.
+        workers (int): The number of local worker processes to start.
+        say (SayCallback): Called with progress messages.
+        root (str): The directory shared by the coordinator and workers.
+        threads (int): The TensorFlow threads per operation in each local worker.
+        embedding_dir (str, optional): The directory text embeddings are cached in.
+        result_dir (str, optional): The directory generated images are cached in.
+
+    Returns:
+        tuple[int, int]: The number of jobs rendered and the number that failed.
+    """
+
+    queue = JobQueue.create(root)
+    queue.put(jobs)
+
+    # Spawned processes start without TensorFlow, so each can pin its threads
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=local_worker,
+            args=(os.path.abspath(root), threads, embedding_dir, result_dir),
+        )
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    seen = set()
+    rendered, failed = 0, 0
+    timings: dict[str, list[float]] = {}
+
+    try:
+        while len(seen) < len(jobs):
+            queue.beat()
+
+            # Jobs held by a local worker that crashed would never finish
+            for process in processes:
+                if process.exitcode not in (None, 0):
+                    queue.abandon(f"{socket.gethostname()}-{process.pid}")
+
+            # Nor would pending jobs once no local worker is left, which leaves
+            # only the jobs claimed by workers on other machines to wait for
+            if processes and not any(process.is_alive() for process in processes):
+                queue.cancel(worker_id(), "No worker was left to render the job.")
+
+            for state, result in queue.results(seen):
+                label = f"seed {result['seed']} over {result['step']} steps"
+
+                if state == FAILED:
+                    failed += 1
+                    say(
+                        ":x: [bold red]Error[/bold red]:",
+                        f"Failed {label} on {result['worker']}: {result['error']}",
+                    )
+                    continue
+
+                rendered += 1
+                timings.setdefault(result["worker"], []).append(result["seconds"])
+                say(
+                    f":robot: [bold blue]Image {len(seen)} of {len(jobs)}[/bold blue]:",
+                    f"Rendered {label} on {result['worker']}",
+                    f"in {result['seconds']:.1f}s",
+                )
+
+            time.sleep(POLL_INTERVAL)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+        queue.remove()
+
+    for worker, seconds in sorted(timings.items()):
+        say(
+            f":robot: [bold blue]Worker {worker}[/bold blue]:",
+            f"{len(seconds)} images, {sum(seconds) / len(seconds):.1f}s per image",
+        )
+
+    return rendered, failed
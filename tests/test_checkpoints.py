@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from sda.models.checkpoints import Checkpoint, CheckpointStore
+from sda.models.samplers import SAMPLERS, make_sampler
+
+SETTINGS: dict = {"include": "a fox", "sampler": "ddim-v1-linspace", "seed": 3}
+
+
+def _run(solver, latent: np.ndarray, iterations: range) -> np.ndarray:
+    for iteration in iterations:
+        latent = solver.step(iteration, latent, np.float32(0.9) * latent)
+    return latent
+
+
+@pytest.mark.parametrize("sampler", SAMPLERS)
+def test_round_trip_continues_schedule(tmp_path, sampler):
+    latent = np.random.default_rng(0).standard_normal((1, 4, 4, 4), "float32")
+    expected = _run(make_sampler(sampler, 8, seeds=[3]), latent, range(8))
+
+    first = make_sampler(sampler, 8, seeds=[3])
+    halfway = _run(first, latent, range(5))
+    CheckpointStore(str(tmp_path), SETTINGS).save(
+        [Checkpoint(8, 5, halfway, first.state())]
+    )
+
+    checkpoint = CheckpointStore(str(tmp_path), SETTINGS).load()[8]
+    assert (checkpoint.steps, checkpoint.iteration) == (8, 5)
+    np.testing.assert_array_equal(checkpoint.latent, halfway)
+
+    second = make_sampler(sampler, 8, seeds=[3])
+    second.restore(checkpoint.state)
+    latent = _run(second, checkpoint.latent, range(checkpoint.iteration, 8))
+    np.testing.assert_array_equal(latent, expected)
+
+
+def test_jobs_and_step_counts_are_kept_apart(tmp_path):
+    store = CheckpointStore(str(tmp_path), SETTINGS)
+    latents = {steps: np.full((1, 2, 2, 4), steps, "float32") for steps in (4, 6)}
+    store.save([Checkpoint(steps, 2, latents[steps], {}) for steps in latents])
+    store.save([Checkpoint(6, 3, latents[6], {})])
+
+    checkpoints = store.load()
+    assert {
+        steps: checkpoint.iteration for steps, checkpoint in checkpoints.items()
+    } == {
+        4: 2,
+        6: 3,
+    }
+    assert CheckpointStore(str(tmp_path), {**SETTINGS, "seed": 4}).load() == {}
+
+    store.clear()
+    assert store.load() == {}
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from sda.animators.crossfade import crossfade
+
+
+@pytest.fixture(scope="module")
+def frames():
+    generator = np.random.default_rng(0)
+    return tuple(
+        generator.integers(0, 256, (48, 64, 3), dtype="uint8") for _ in range(2)
+    )
+
+
+@pytest.mark.parametrize("count", [1, 7, 30])
+def test_matches_image_blend(frames, count):
+    src, dst = frames
+    expected = [
+        np.asarray(Image.blend(Image.fromarray(src), Image.fromarray(dst), c / count))
+        for c in range(count)
+    ]
+
+    faded = list(crossfade(src, dst, count))
+    assert len(faded) == count
+    for frame, blended in zip(faded, expected):
+        np.testing.assert_array_equal(frame, blended)
+
+    out = np.empty_like(src)
+    for index, frame in enumerate(crossfade(src, dst, count, out, 1, count - 1), 1):
+        assert frame is out
+        np.testing.assert_array_equal(frame, expected[index])
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from benchmarks.generation import PARITY_TOLERANCE
+from benchmarks.stub_model import stub_model
+from sda.models.samplers import SAMPLERS
+
+
+@pytest.fixture(scope="module")
+def model():
+    return stub_model(128, 128)
+
+
+def _generate(model, fused_guidance: bool, sampler: str) -> list:
+    return model.generate_image(
+        include_prompt="a misty forest at dawn",
+        exclude_prompt="text, watermark",
+        num_steps=4,
+        unconditional_guidance_scale=7.5,
+        seed=[1, 2],
+        fused_guidance=fused_guidance,
+        sampler=sampler,
+    )
+
+
+def test_fused_noise_prediction_matches_separate_passes(model):
+    latent = np.random.default_rng(0).standard_normal((2, 16, 16, 4), "float32")
+    t_emb = model._get_timestep_embedding(500, 2)
+    context = model._expand_tensor(model.encode_text("a misty forest at dawn"), 2)
+    unconditional = model._expand_tensor(model.encode_text("text, watermark"), 2)
+
+    fused, separate = (
+        np.asarray(
+            model._predict_noise(latent, t_emb, context, unconditional, 7.5, fused)
+        )
+        for fused in (True, False)
+    )
+
+    np.testing.assert_allclose(fused, separate, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize("sampler", SAMPLERS)
+def test_fused_guidance_matches_separate_passes(model, sampler):
+    fused = _generate(model, True, sampler)
+    separate = _generate(model, False, sampler)
+
+    assert len(fused) == len(separate) == 2
+    for image, other in zip(fused, separate):
+        difference = np.abs(np.asarray(image, "int16") - np.asarray(other, "int16"))
+        assert difference.max() <= PARITY_TOLERANCE
@@ -0,0 +1,118 @@
+import os
+
+import pytest
+from PIL import Image
+
+from sda.utilities.images import (
+    empty_dir,
+    image_records,
+    is_empty,
+    list_dir,
+    save_image,
+)
+from sda.utilities.manifest import is_current, manifest_path, read_manifest
+
+COLORS: dict[int, str] = {1: "red", 2: "green", 3: "blue"}
+
+
+def _save(directory, seed: int, step: int, prompt: str | None = "prompt") -> None:
+    image = Image.new("RGB", (32, 16), COLORS[step])
+    save_image(image, seed, step, str(directory), prompt=prompt)
+
+
+def _age_manifest(directory) -> None:
+    # Make the directory newer than its manifest, as a change by hand would
+    os.utime(manifest_path(str(directory)), ns=(0, 0))
+
+
+def test_records_saved_images(tmp_path):
+    _save(tmp_path, 7, 2)
+
+    (record,) = read_manifest(str(tmp_path))
+    assert record["path"] == "0007-002.png"
+    assert (record["seed"], record["step"], record["prompt"]) == (7, 2, "prompt")
+    assert (record["width"], record["height"]) == (32, 16)
+    assert len(record["checksum"]) == 64
+
+
+def test_reads_latest_records_in_order(tmp_path):
+    for seed, step in [(9, 1), (3, 2), (3, 1), (9, 3)]:
+        _save(tmp_path, seed, step)
+    _save(tmp_path, 3, 2, prompt="other")
+
+    records = read_manifest(str(tmp_path))
+    assert [(record["seed"], record["step"]) for record in records] == [
+        (3, 1),
+        (3, 2),
+        (9, 1),
+        (9, 3),
+    ]
+    assert records[1]["prompt"] == "other"
+
+
+def test_trusts_current_manifest(tmp_path, monkeypatch):
+    for step in COLORS:
+        _save(tmp_path, 1, step)
+    assert is_current(str(tmp_path))
+
+    def listdir(directory):
+        raise AssertionError("the directory was listed")
+
+    monkeypatch.setattr(os, "listdir", listdir)
+    assert [image.step for image in list_dir(str(tmp_path))] == [1, 2, 3]
+    assert not is_empty(str(tmp_path))
+
+
+def test_falls_back_to_file_names(tmp_path):
+    _save(tmp_path, 1, 1)
+    _save(tmp_path, 1, 2)
+    Image.new("RGB", (8, 8)).save(tmp_path / "0001-003.png")
+    os.remove(tmp_path / "0001-001.png")
+    _age_manifest(tmp_path)
+
+    assert not is_current(str(tmp_path))
+    assert image_records(str(tmp_path)) is None
+    assert [image.step for image in list_dir(str(tmp_path))] == [2, 3]
+
+
+def test_indexes_images_saved_before_manifest(tmp_path):
+    Image.new("RGB", (8, 8)).save(tmp_path / "0002-005.png")
+    _save(tmp_path, 1, 1)
+
+    records = image_records(str(tmp_path))
+    assert [(record["path"], record["prompt"]) for record in records] == [
+        ("0001-001.png", "prompt"),
+        ("0002-005.png", None),
+    ]
+
+
+@pytest.mark.parametrize("current", [True, False])
+def test_empty_dir(tmp_path, current):
+    (tmp_path / "notes.txt").write_text("leftover")
+    _save(tmp_path, 1, 1)
+    assert is_current(str(tmp_path))
+    if not current:
+        _age_manifest(tmp_path)
+
+    assert not is_empty(str(tmp_path))
+    empty_dir(str(tmp_path))
+
+    assert os.listdir(tmp_path) == []
+    assert is_empty(str(tmp_path))
+
+
+def test_resume_only_keeps_frames_of_the_same_job(tmp_path):
+    from sda.app import _rendered
+
+    for step, (prompt, sampler) in enumerate(
+        [("prompt", "ddim-v1-linspace"), ("other", "ddim-v1-linspace")], start=1
+    ):
+        image = Image.new("RGB", (32, 16), COLORS[step])
+        save_image(image, 5, step, str(tmp_path), prompt=prompt, sampler=sampler)
+    _save(tmp_path, 5, 3, prompt="prompt")
+
+    directory = str(tmp_path)
+    assert _rendered(directory, 5, (32, 16), "prompt", "ddim-v1-linspace") == [1, 3]
+    assert _rendered(directory, 5, (32, 16), "prompt", "euler-a-v1-linspace") == [3]
+    assert _rendered(directory, 5, (64, 64), "prompt", "ddim-v1-linspace") == []
+    assert _rendered(directory, 6, (32, 16), "prompt", "ddim-v1-linspace") == []
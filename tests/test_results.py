@@ -0,0 +1,61 @@
+import os
+from types import SimpleNamespace
+
+from PIL import Image
+
+from sda.jobs import _result_settings
+from sda.models.results import ResultCache
+from sda.models.samplers import SAMPLERS
+
+
+def _flush(cache: ResultCache) -> None:
+    # Writes run in order on a single thread, so a no-op waits for them all
+    cache._executor.submit(lambda: None).result()
+
+
+def test_key_covers_every_setting():
+    model = SimpleNamespace(
+        img_width=512, img_height=768, fast_decode=False, decode_memory=0
+    )
+    settings = _result_settings(model, "a fox", "blurry", 7.5, "euler-a", "trailing")
+
+    assert settings == {
+        "include": "a fox",
+        "exclude": "blurry",
+        "adherence": 7.5,
+        "width": 512,
+        "height": 768,
+        "sampler": SAMPLERS["euler-a"].identifier("trailing"),
+        "decoder": "full",
+    }
+
+    cache = ResultCache("model-a", "unused")
+    key = cache.key(settings)
+    assert key == cache.key(dict(reversed(settings.items())))
+    assert key != ResultCache("model-b", "unused").key(settings)
+    for name, value in [("sampler", "ddim-v1-trailing"), ("width", 768)]:
+        assert key != cache.key({**settings, name: value})
+
+
+def test_evicts_least_recently_used_first(tmp_path):
+    cache = ResultCache("model", str(tmp_path))
+    image = Image.new("RGB", (64, 64), "red")
+    for key in "abc":
+        cache.put(key, image)
+    _flush(cache)
+
+    # Use c, then b and finally a, which leaves c the least recently used
+    for age, key in enumerate("cba"):
+        os.utime(cache._path(key), ns=(age * 10**9, age * 10**9))
+    assert cache.get("b") is not None
+
+    cache.max_bytes = 3 * os.path.getsize(cache._path("a"))
+    cache.put("d", image)
+    _flush(cache)
+
+    assert sorted(os.listdir(tmp_path)) == ["a.png", "b.png", "d.png"]
+
+    cache.put("e", image)
+    _flush(cache)
+
+    assert sorted(os.listdir(tmp_path)) == ["b.png", "d.png", "e.png"]
@@ -0,0 +1,119 @@
+import math
+
+import numpy as np
+import pytest
+from keras import ops
+from keras_cv.src.models.stable_diffusion.constants import _ALPHAS_CUMPROD
+
+from benchmarks.generation import PARITY_TOLERANCE
+from benchmarks.stub_model import stub_model
+from sda.models.samplers import (
+    SAMPLERS,
+    SPACINGS,
+    DDIMSampler,
+    get_timesteps,
+    make_sampler,
+)
+
+INCLUDE: str = "a misty forest at dawn"
+EXCLUDE: str = "text, watermark"
+
+
+@pytest.fixture(scope="module")
+def model():
+    return stub_model(128, 128)
+
+
+def _original_ddim(model, seed: int, num_steps: int):
+    # The DDIM loop generate_image ran before samplers were pluggable
+    context = model._expand_tensor(model.encode_text(INCLUDE), 1)
+    unconditional_context = model._expand_tensor(model.encode_text(EXCLUDE), 1)
+    latent = model._get_initial_diffusion_noise(1, seed)
+
+    timesteps = get_timesteps(num_steps, "linspace")
+    alphas = [_ALPHAS_CUMPROD[t] for t in timesteps]
+    alphas_prev = [1.0] + alphas[:-1]
+    for index, timestep in list(enumerate(timesteps))[::-1]:
+        latent_prev = latent
+        t_emb = model._get_timestep_embedding(timestep, 1)
+        latent = model._predict_noise(
+            latent, t_emb, context, unconditional_context, 7.5, False
+        )
+        a_t, a_prev = alphas[index], alphas_prev[index]
+        latent = ops.cast(latent, latent_prev.dtype)
+        pred_x0 = (latent_prev - math.sqrt(1 - a_t) * latent) / math.sqrt(a_t)
+        latent = (
+            ops.array(latent) * math.sqrt(1.0 - a_prev) + math.sqrt(a_prev) * pred_x0
+        )
+
+    return np.asarray(latent)
+
+
+def test_ddim_matches_original_loop(model, monkeypatch):
+    latents = []
+    decode_images = model.decode_images
+    monkeypatch.setattr(
+        model,
+        "decode_images",
+        lambda latent: latents.append(np.asarray(latent)) or decode_images(latent),
+    )
+
+    image = model.generate_image(
+        INCLUDE, EXCLUDE, num_steps=5, seed=3, fused_guidance=False, sampler="ddim"
+    )
+
+    np.testing.assert_array_equal(latents[-1], _original_ddim(model, 3, 5))
+    assert np.array_equal(np.asarray(image), np.asarray(decode_images(latents[-1])[0]))
+
+
+def test_euler_ancestral_batch_matches_single_seeds(model):
+    batched = model.generate_image(
+        INCLUDE, EXCLUDE, num_steps=4, seed=[1, 2], sampler="euler-a"
+    )
+
+    for image, seed in zip(batched, [1, 2]):
+        (single,) = model.generate_image(
+            INCLUDE, EXCLUDE, num_steps=4, seed=[seed], sampler="euler-a"
+        )
+        difference = np.abs(np.asarray(image, "int16") - np.asarray(single, "int16"))
+        assert difference.max() <= PARITY_TOLERANCE
+
+
+@pytest.mark.parametrize("sampler", SAMPLERS)
+def test_restore_continues_schedule(sampler):
+    def run(solver, latent, iterations):
+        for iteration in iterations:
+            latent = solver.step(iteration, latent, np.float32(0.9) * latent)
+        return latent
+
+    latent = np.random.default_rng(0).standard_normal((2, 4, 4, 4), "float32")
+    expected = run(make_sampler(sampler, 6, seeds=[1, 2]), latent, range(6))
+
+    first = make_sampler(sampler, 6, seeds=[1, 2])
+    halfway = run(first, latent, range(3))
+    second = make_sampler(sampler, 6, seeds=[1, 2])
+    second.restore(first.state())
+
+    np.testing.assert_array_equal(run(second, halfway, range(3, 6)), expected)
+
+
+def test_spacings():
+    linspace = get_timesteps(10, "linspace")
+    assert linspace[0] == 0 and linspace[-1] == 999
+    np.testing.assert_array_equal(get_timesteps(10, "leading"), np.arange(1, 1000, 100))
+    np.testing.assert_array_equal(
+        get_timesteps(10, "trailing"), np.arange(99, 1000, 100)
+    )
+
+    for spacing in SPACINGS:
+        timesteps = DDIMSampler(10, spacing).timesteps
+        assert len(timesteps) == 10
+        assert np.all(np.diff(timesteps) < 0)
+
+    with pytest.raises(ValueError):
+        get_timesteps(10, "uniform")
+
+
+def test_identifier():
+    assert DDIMSampler.identifier("trailing") == "ddim-v1-trailing"
+    assert len({sampler.identifier() for sampler in SAMPLERS.values()}) == len(SAMPLERS)
@@ -0,0 +1,27 @@
+import pytest
+from PIL import Image
+
+from sda.animators.gif_animator import GIFAnimator
+from sda.animators.sources import SharedSources
+from sda.utilities.images import list_dir, save_image
+
+
+@pytest.fixture(scope="module")
+def images(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp("frames"))
+    for step, color in enumerate(["red", "green", "blue", "white"], start=1):
+        save_image(Image.new("RGB", (128, 128), color), 7, step, directory)
+
+    return list_dir(directory)
+
+
+@pytest.mark.parametrize("loop", [False, True])
+def test_shared_sources_load_each_frame_once(images, tmp_path, loop):
+    sources = SharedSources(2)
+    for name in ("first", "second"):
+        GIFAnimator(sources=sources).generate(
+            images, str(tmp_path / name), loop=loop, hold_time=0.1, fade_time=0.1
+        )
+
+    assert sources.loads == len(images)
+    assert not sources._entries